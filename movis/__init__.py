@@ -1,3 +1,4 @@
+from . import cache  # noqa
 from . import effect  # noqa
 from . import layer  # noqa
 from .attribute import (Attribute, AttributesMixin,  # noqa
@@ -59,7 +59,8 @@ class Attribute:
 
     def __call__(self, layer_time: float) -> np.ndarray:
         if self._motion is None and len(self._functions) == 0:
-            return transform_to_numpy(self._init_value, self._value_type)
+            # The initial value is already normalized by transform_to_numpy(), so a copy is enough
+            return self._init_value.copy()
         else:
             value = self._init_value
             if self._motion is not None:
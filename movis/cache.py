@@ -0,0 +1,575 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import types
+import uuid
+import zlib
+from collections import OrderedDict
+from enum import Enum
+from importlib import metadata
+from pathlib import PurePath
+from typing import Any, Hashable, Iterator, NamedTuple, Protocol, Union
+
+import numpy as np
+from diskcache import Cache
+
+from .attribute import Attribute
+
+try:
+    import lz4.frame
+    lz4_available = True
+except ImportError:
+    lz4_available = False
+
+try:
+    import zstandard
+    zstd_available = True
+except ImportError:
+    zstd_available = False
+
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+
+class CacheBackend(Protocol):
+    """The protocol that defines the interface of a cache used by ``Composition``.
+
+    A cache is a mapping from hashable keys to rendered images. ``diskcache.Cache`` and ``MemoryCache``
+    comply with this protocol, and users can also implement their own cache (`e.g.`, a shared one).
+    A cache is allowed to drop any item at any time, but it must not return stale values for a key.
+    Since an item may be dropped between ``key in cache`` and ``cache[key]``, a missing item must raise ``KeyError``.
+    """
+
+    def __contains__(self, key: Hashable) -> bool:
+        ...
+
+    def __getitem__(self, key: Hashable) -> Any:
+        ...
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        ...
+
+    def __delitem__(self, key: Hashable) -> None:
+        ...
+
+    def clear(self) -> int | None:
+        """Remove all items from the cache."""
+        ...
+
+
+CacheSpec = Union[str, CacheBackend, None]
+
+
+class MemoryCache:
+    """An in-process cache that keeps the least recently used items within a byte budget.
+
+    Unlike ``diskcache.Cache``, arrays are stored as they are without being serialized,
+    so a cache hit costs only a dictionary lookup. In exchange, the stored arrays are made read-only
+    and shared with all the callers that retrieve them.
+    Items that refer to the same memory (`e.g.`, a frame of a nested composition that is also cached
+    as a layer image by its parent) are counted only once in the budget.
+
+    Examples:
+        >>> import movis as mv
+        >>> cache = mv.cache.MemoryCache(size_limit=256 * 1024 * 1024)
+        >>> composition = mv.layer.Composition(size=(640, 480), duration=5.0, cache=cache)
+
+    Args:
+        size_limit:
+            The maximum total size of the stored values in bytes.
+            The least recently used items are evicted when the total size exceeds it.
+    """
+
+    def __init__(self, size_limit: int = DEFAULT_CACHE_SIZE) -> None:
+        assert size_limit >= 0, "size_limit must be non-negative"
+        self._size_limit = size_limit
+        self._items: OrderedDict[Hashable, tuple[Any, int, tuple[int, int] | None]] = OrderedDict()
+        self._buffers: dict[tuple[int, int], int] = {}
+        self._volume = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Cached items are not carried over to other processes
+        return {'size_limit': self._size_limit}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state['size_limit'])  # type: ignore
+
+    @property
+    def size_limit(self) -> int:
+        """The maximum total size of the stored values in bytes."""
+        return self._size_limit
+
+    def volume(self) -> int:
+        """Return the total size of the stored values in bytes."""
+        return self._volume
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            return iter(list(self._items))
+
+    def __getitem__(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._items[key][0]
+            self._items.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for ``key`` if it is cached, otherwise ``default``."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        buffer: tuple[int, int] | None = None
+        if isinstance(value, np.ndarray):
+            value = value.view()
+            value.flags.writeable = False
+            size = value.nbytes
+            # The stored views keep their memory alive, so the address identifies the data while it is cached
+            buffer = (value.__array_interface__['data'][0], size)
+        else:
+            size = _get_size(value)
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            if self._size_limit < size:
+                return
+            self._items[key] = (value, size, buffer)
+            if buffer is None:
+                self._volume += size
+            else:
+                n_refs = self._buffers.get(buffer, 0)
+                if n_refs == 0:
+                    self._volume += size
+                self._buffers[buffer] = n_refs + 1
+            while self._size_limit < self._volume:
+                self._remove(next(iter(self._items)))
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, buffer = self._items.pop(key)
+        if buffer is None:
+            self._volume -= size
+            return
+        n_refs = self._buffers.pop(buffer) - 1
+        if n_refs == 0:
+            self._volume -= size
+        else:
+            self._buffers[buffer] = n_refs
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> int:
+        """Remove all items from the cache and return the number of removed items."""
+        with self._lock:
+            n_items = len(self._items)
+            self._items.clear()
+            self._buffers.clear()
+            self._volume = 0
+        return n_items
+
+
+class PersistentCache(Cache):
+    """An on-disk cache that is kept across runs.
+
+    Compositions using this cache identify cached images by stable content hashes
+    (see ``get_fingerprint()``) instead of keys that are only valid in the current process.
+    Therefore, running the same script again, `e.g.`, after a small edit, reuses all the images
+    of the layers that have not changed since the previous run.
+
+    .. note::
+        The source code of user-defined layer classes is not hashed. If the implementation of such a layer
+        is changed, the cache directory should be cleared.
+
+    Examples:
+        >>> import movis as mv
+        >>> cache = mv.cache.PersistentCache('.movis_cache')
+        >>> composition = mv.layer.Composition(size=(640, 480), duration=5.0, cache=cache)
+
+    Args:
+        directory:
+            The directory in which the cache is stored.
+        size_limit:
+            The maximum size of the cache in bytes.
+    """
+
+    stable_keys = True
+
+    def __init__(self, directory: str | os.PathLike, size_limit: int = DEFAULT_CACHE_SIZE) -> None:
+        super().__init__(directory=str(directory), size_limit=size_limit)
+
+
+class _CompressedArray(NamedTuple):
+    """A compressed array, which is cropped to ``shape`` at ``offset`` of an image of ``full_shape`` if cropped."""
+    data: bytes
+    dtype: str
+    shape: tuple[int, ...]
+    full_shape: tuple[int, ...] | None
+    offset: tuple[int, int]
+
+
+class CompressedCache:
+    """A cache backend that stores arrays in another backend with lossless compression.
+
+    Rendered layers such as texts and shapes are mostly transparent, so that they are compressed
+    by an order of magnitude or more, and the same budget holds many more frames.
+    The other values are stored as they are.
+
+    Examples:
+        >>> import movis as mv
+        >>> cache = mv.cache.CompressedCache('memory', size_limit=256 * 1024 * 1024, codec='zlib')
+        >>> composition = mv.layer.Composition(size=(640, 480), duration=5.0, cache=cache)
+
+    Args:
+        cache:
+            The specification of the backend that stores compressed arrays (see ``create_cache()``).
+        size_limit:
+            The maximum size of the backend in bytes. It is ignored if ``cache`` is an object.
+        codec:
+            The compression codec. ``'zlib'`` is always available,
+            and ``'lz4'`` and ``'zstd'`` require ``lz4`` and ``zstandard`` packages, respectively.
+        level:
+            The compression level of the codec. Lower levels are faster.
+        crop_alpha:
+            If ``True``, RGBA images are cropped to the bounding box of their non-transparent pixels
+            before they are compressed, and restored to the original size when they are retrieved.
+    """
+
+    def __init__(
+        self, cache: CacheSpec = 'memory', size_limit: int = DEFAULT_CACHE_SIZE,
+        codec: str = 'zlib', level: int = 1, crop_alpha: bool = True,
+    ) -> None:
+        if codec == 'lz4' and not lz4_available:
+            raise ImportError("lz4 is required for codec='lz4'")
+        elif codec == 'zstd' and not zstd_available:
+            raise ImportError("zstandard is required for codec='zstd'")
+        elif codec not in ('zlib', 'lz4', 'zstd'):
+            raise ValueError(f"Unknown codec: {codec}")
+        self._backend = create_cache(cache, size_limit)
+        self._codec = codec
+        self._level = level
+        self._crop_alpha = crop_alpha
+
+    @property
+    def backend(self) -> CacheBackend:
+        """The backend that stores compressed arrays."""
+        return self._backend
+
+    @property
+    def stable_keys(self) -> bool:
+        """Whether the backend is kept across runs."""
+        return getattr(self._backend, 'stable_keys', False)
+
+    def _compress(self, data: Any) -> bytes:
+        if self._codec == 'lz4':
+            return lz4.frame.compress(data, compression_level=self._level)
+        elif self._codec == 'zstd':
+            return zstandard.ZstdCompressor(level=self._level).compress(data)
+        return zlib.compress(data, self._level)
+
+    def _decompress(self, data: bytes) -> bytes:
+        if self._codec == 'lz4':
+            return lz4.frame.decompress(data)
+        elif self._codec == 'zstd':
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def _encode(self, value: np.ndarray) -> _CompressedArray:
+        full_shape = None
+        offset = (0, 0)
+        if self._crop_alpha and value.ndim == 3 and value.shape[2] == 4 and value.dtype == np.uint8:
+            alpha = value[:, :, 3]
+            rows = np.flatnonzero(alpha.any(axis=1))
+            if len(rows) == 0:
+                full_shape, value = value.shape, value[:0, :0]
+            else:
+                cols = np.flatnonzero(alpha[rows[0]:rows[-1] + 1].any(axis=0))
+                y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+                if (y1 - y0, x1 - x0) != value.shape[:2]:
+                    full_shape, offset = value.shape, (int(x0), int(y0))
+                    value = value[y0:y1, x0:x1]
+        data = self._compress(np.ascontiguousarray(value).data)
+        return _CompressedArray(data, value.dtype.str, value.shape, full_shape, offset)
+
+    def _decode(self, item: _CompressedArray) -> np.ndarray:
+        value = np.frombuffer(self._decompress(item.data), dtype=item.dtype).reshape(item.shape)
+        if item.full_shape is None:
+            return value
+        image = np.zeros(item.full_shape, dtype=value.dtype)
+        x, y = item.offset
+        image[y:y + value.shape[0], x:x + value.shape[1]] = value
+        return image
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._backend
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._backend)  # type: ignore
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self._backend[key]
+        return self._decode(value) if isinstance(value, _CompressedArray) else value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._backend[key] = self._encode(value) if isinstance(value, np.ndarray) else value
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._backend[key]
+
+    def clear(self) -> int | None:
+        """Remove all items from the backend."""
+        return self._backend.clear()
+
+
+class NullCache:
+    """A cache that stores nothing, used to turn caching off."""
+
+    def __contains__(self, key: Hashable) -> bool:
+        return False
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(())
+
+    def __getitem__(self, key: Hashable) -> Any:
+        raise KeyError(key)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        pass
+
+    def __delitem__(self, key: Hashable) -> None:
+        raise KeyError(key)
+
+    def clear(self) -> int:
+        """Do nothing and return ``0``."""
+        return 0
+
+
+def _get_size(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    elif isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_get_size(x) for x in value)
+    return sys.getsizeof(value)
+
+
+class CacheView:
+    """A view of a cache backend that can be shared by a tree of compositions.
+
+    Each view prefixes the keys with its own namespace, so that compositions sharing the same backend
+    never see the items of each other, while all of them are stored within the budget of the backend.
+    ``diskcache.Cache`` and ``MemoryCache`` are created on first use.
+
+    Args:
+        cache:
+            The specification of the backend (see ``create_cache()``).
+        size_limit:
+            The maximum size of the backend in bytes. It is ignored if ``cache`` is an object.
+        shared:
+            Whether the backend is shared with other views.
+    """
+
+    def __init__(
+        self, cache: CacheSpec = 'disk', size_limit: int = DEFAULT_CACHE_SIZE, shared: bool = False,
+    ) -> None:
+        self._spec = cache
+        self._size_limit = size_limit
+        self._backend: CacheBackend | None = None if isinstance(cache, str) else create_cache(cache)
+        # Keys stable across runs must not depend on the view
+        self.stable_keys: bool = getattr(self._backend, 'stable_keys', False)
+        self._namespace = '' if self.stable_keys else uuid.uuid4().hex
+        self.shared = shared
+
+    @property
+    def backend(self) -> CacheBackend:
+        """The cache backend of the view."""
+        if self._backend is None:
+            self._backend = create_cache(self._spec, self._size_limit)
+        return self._backend
+
+    def share(self) -> CacheView:
+        """Return a new view of the same backend with its own namespace."""
+        self.shared = True
+        return CacheView(self.backend, shared=True)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return (self._namespace, key) in self.backend
+
+    def __getitem__(self, key: Hashable) -> Any:
+        return self.backend[(self._namespace, key)]
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.backend[(self._namespace, key)] = value
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self.backend[(self._namespace, key)]
+
+    def __iter__(self) -> Iterator[Hashable]:
+        if self._backend is None:
+            return iter(())
+        namespace = self._namespace
+        return iter([key[1] for key in self._backend if isinstance(key, tuple) and key[0] == namespace])  # type: ignore
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def clear(self) -> int | None:
+        """Remove all items of the view.
+
+        If the backend is shared, the items of the view are left to be evicted by the backend
+        and the view switches to a new namespace, which takes a constant time.
+        Nothing is removed if the keys are stable content hashes, since they never refer to stale items.
+        """
+        if self.stable_keys:
+            return None
+        elif self.shared:
+            self._namespace = uuid.uuid4().hex
+            return None
+        return None if self._backend is None else self._backend.clear()
+
+
+def create_cache(cache: CacheSpec, size_limit: int = DEFAULT_CACHE_SIZE) -> CacheBackend:
+    """Create a cache from the given specification.
+
+    Args:
+        cache:
+            ``'disk'`` for ``diskcache.Cache`` in a temporary directory, ``'memory'`` for ``MemoryCache``,
+            or ``None`` to turn caching off. An object that complies with ``CacheBackend`` is returned as it is.
+        size_limit:
+            The maximum size of the cache in bytes. It is ignored if ``cache`` is an object.
+
+    Returns:
+        A cache that complies with ``CacheBackend``.
+    """
+    if cache is None:
+        return NullCache()
+    elif isinstance(cache, str):
+        if cache == 'disk':
+            return Cache(size_limit=size_limit)
+        elif cache == 'memory':
+            return MemoryCache(size_limit=size_limit)
+        raise ValueError(f"Unknown cache backend: {cache}")
+    return cache
+
+
+def _get_version() -> str:
+    try:
+        return metadata.version('movis')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+_VERSION = _get_version()
+
+
+def get_fingerprint(obj: Any) -> str:
+    """Return a hash of the static state of a layer or an effect that is stable across runs.
+
+    The hash covers the class and the version of Movis, and the instance variables of the object recursively.
+    Files referred to by paths are identified by their absolute path, modification time, and size,
+    and arrays by their contents. Functions are identified by their code, the values captured in their closures,
+    and the global variables they refer to. Objects can define ``_get_fingerprint_state()`` to return
+    the state to be hashed instead of their instance variables (`e.g.`, to exclude lazily loaded data).
+    Animatable attributes are not hashed here because their values at each time are a part of
+    the key of the object (see ``get_key()``).
+
+    Args:
+        obj:
+            A layer, an effect, or any other object.
+
+    Returns:
+        A hexadecimal string of the hash.
+    """
+    state = _get_fingerprint_state(obj, set())
+    return hashlib.blake2b(pickle.dumps(state, protocol=4), digest_size=16).hexdigest()
+
+
+def _get_file_state(path: str | PurePath) -> tuple[Any, ...]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ('file', str(path))
+    return ('file', os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _get_fingerprint_state(obj: Any, visited: set[int]) -> Any:
+    if obj is None or isinstance(obj, (bool, int, float, bytes)):
+        return obj
+    elif isinstance(obj, str):
+        return _get_file_state(obj) if os.path.isfile(obj) else obj
+    elif isinstance(obj, Enum):
+        return (type(obj).__qualname__, obj.name)
+    elif isinstance(obj, PurePath):
+        return _get_file_state(obj)
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    elif isinstance(obj, np.ndarray):
+        digest = hashlib.blake2b(np.ascontiguousarray(obj).data, digest_size=16).hexdigest()
+        return ('ndarray', obj.dtype.str, obj.shape, digest)
+    elif isinstance(obj, type):
+        return ('type', obj.__module__, obj.__qualname__)
+    elif isinstance(obj, types.ModuleType):
+        return ('module', obj.__name__)
+
+    if id(obj) in visited:
+        return ('cycle',)
+    visited.add(id(obj))
+    try:
+        if isinstance(obj, types.FunctionType):
+            return _get_function_state(obj, visited)
+        elif isinstance(obj, types.MethodType):
+            return ('method', _get_fingerprint_state(obj.__func__, visited),
+                    _get_fingerprint_state(obj.__self__, visited))
+        elif isinstance(obj, (list, tuple)):
+            return tuple(_get_fingerprint_state(x, visited) for x in obj)
+        elif isinstance(obj, dict):
+            return tuple(
+                (repr(k), _get_fingerprint_state(v, visited)) for k, v in obj.items())
+        cls = (type(obj).__module__, type(obj).__qualname__, _VERSION)
+        if isinstance(obj, Attribute):
+            return cls
+        elif hasattr(obj, '_get_fingerprint_state'):
+            return cls + (_get_fingerprint_state(obj._get_fingerprint_state(), visited),)
+        elif hasattr(obj, '__dict__'):
+            return cls + tuple(
+                (name, _get_fingerprint_state(value, visited)) for name, value in sorted(vars(obj).items()))
+        # Opaque objects (e.g., file readers) are identified only by their class
+        return cls
+    finally:
+        visited.discard(id(obj))
+
+
+def _get_code_state(code: types.CodeType, names: set[str]) -> tuple[Any, ...]:
+    # Nested code objects (e.g., lambdas) are hashed by their contents since their reprs contain addresses
+    names.update(code.co_names)
+    consts = tuple(
+        _get_code_state(c, names) if isinstance(c, types.CodeType) else repr(c) for c in code.co_consts)
+    return (code.co_code, consts)
+
+
+def _get_function_state(func: types.FunctionType, visited: set[int]) -> tuple[Any, ...]:
+    names: set[str] = set()
+    code = _get_code_state(func.__code__, names)
+    cells = []
+    for cell in func.__closure__ or ():
+        try:
+            cells.append(_get_fingerprint_state(cell.cell_contents, visited))
+        except ValueError:
+            # The variable is not assigned yet
+            cells.append(('empty',))
+    global_vars = tuple(
+        (name, _get_fingerprint_state(func.__globals__[name], visited))
+        for name in sorted(names) if name in func.__globals__)
+    defaults = _get_fingerprint_state(func.__defaults__, visited)
+    return ('function', func.__module__, func.__qualname__, code, tuple(cells), global_vars, defaults)
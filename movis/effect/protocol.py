@@ -44,3 +44,16 @@ class BasicEffect(Effect):
             A hashable key that represents the state of the layer at the given time.
         """
         return time
+
+    @property
+    def thread_safe(self) -> bool:
+        """An optional property for any effect implementation.
+
+        This property indicates whether the effect can be applied in a worker thread
+        concurrently with other layers (see ``concurrent_layers`` of ``Composition``).
+        If not implemented, it is assumed that the effect is thread-safe.
+
+        Returns:
+            ``True`` if the effect can be applied in a worker thread.
+        """
+        return True
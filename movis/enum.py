@@ -5,6 +5,7 @@ class CacheType(Enum):
     """A cache type used to determine how a result is cached during rendering."""
     COMPOSITION = 0
     LAYER = 1
+    WARPED_LAYER = 2
 
 
 class AttributeType(Enum):
@@ -199,6 +199,7 @@ def _alpha_composite_pil(
     fg_image: np.ndarray,
     position: tuple[int, int] = (0, 0),
     opacity: float = 1.0,
+    in_place: bool = False,
 ) -> np.ndarray:
     assert 0.0 <= opacity <= 1.0, f"opacity must be in [0, 1], but {opacity} is given."
     if opacity < 1.0:
@@ -207,6 +208,20 @@ def _alpha_composite_pil(
         a = int(np.round(opacity * 255))
         c_alpha = (c_alpha * a // 255).astype(np.uint8)
         fg_image[:, :, 3] = c_alpha
+    if in_place:
+        # Only the overlapping region is copied to PIL and written back into bg_image
+        h1, w1 = bg_image.shape[:2]
+        h2, w2 = fg_image.shape[:2]
+        x1, y1 = max(0, position[0]), max(0, position[1])
+        x2, y2 = - min(0, position[0]), - min(0, position[1])
+        w = min(position[0] + w2, w1) - x1
+        h = min(position[1] + h2, h1) - y1
+        if w <= 0 or h <= 0:
+            return bg_image
+        region_pil = Image.fromarray(bg_image[y1: y1 + h, x1: x1 + w])
+        region_pil.alpha_composite(Image.fromarray(fg_image[y2: y2 + h, x2: x2 + w]))
+        bg_image[y1: y1 + h, x1: x1 + w] = np.asarray(region_pil)
+        return bg_image
     base_img_pil = Image.fromarray(bg_image)
     base_img_pil.alpha_composite(
         Image.fromarray(fg_image), (position[0], position[1]))
@@ -220,6 +235,7 @@ def alpha_composite(
     opacity: float = 1.0,
     blending_mode: str | BlendingMode = BlendingMode.NORMAL,
     matte_mode: MatteMode = MatteMode.NONE,
+    in_place: bool = False,
 ) -> np.ndarray:
     """Perform alpha compositing of two images (with alpha channels).
 
@@ -249,6 +265,10 @@ def alpha_composite(
             The mode used for handling the matte channel.
             Available modes are defined in the ``MatteMode`` enum (``NONE``, ``ALPHA``, and ``LUMINANCE``).
             Default is ``MatteMode.NONE``. Note that the matte mode can also be specified as a string.
+        in_place:
+            If ``True``, the result is always written into ``bg_image``, which is then returned.
+            In this case, ``bg_image`` must be writeable.
+            Default is ``False``.
 
     Returns:
         The composited image as a 3D numpy array of shape ``(height, width, 4)``
@@ -260,12 +280,14 @@ def alpha_composite(
     assert fg_image.shape[2] == 4
     assert bg_image.dtype == np.uint8
     assert fg_image.dtype == np.uint8
-    if not bg_image.flags.writeable:
+    if in_place:
+        assert bg_image.flags.writeable, "bg_image must be writeable if in_place=True"
+    elif not bg_image.flags.writeable:
         bg_image = bg_image.copy()
     if blending_mode == BlendingMode.NORMAL and matte_mode == MatteMode.NONE:
         # Use PIL for normal blending mode
         # because it is faster than my implementation
-        return _alpha_composite_pil(bg_image, fg_image, position, opacity)
+        return _alpha_composite_pil(bg_image, fg_image, position, opacity, in_place=in_place)
     else:
         mode = BlendingMode.from_string(blending_mode) \
             if isinstance(blending_mode, str) else blending_mode
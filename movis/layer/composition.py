@@ -1,26 +1,39 @@
 from __future__ import annotations
 
+import hashlib
+import itertools
+import json
+import multiprocessing
+import pickle
+import queue
+import subprocess
 import tempfile
+import threading
+import time as time_module
 import warnings
+from collections import OrderedDict, deque
+from concurrent.futures import (Future, ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed, wait)
 from contextlib import contextmanager
 from os import PathLike
 from pathlib import Path
-from typing import Hashable, Iterator, Sequence
+from typing import Any, Hashable, Iterable, Iterator, NamedTuple, Sequence
 
 import cv2
 import imageio
+import imageio_ffmpeg
 import numpy as np
 import soundfile as sf
-from diskcache import Cache
 from imageio.core.format import Format
 from tqdm import tqdm
 
 from ..attribute import Attribute, AttributeType
 from ..effect import Effect
+from ..cache import DEFAULT_CACHE_SIZE, CacheBackend, CacheSpec, CacheView, get_fingerprint
 from ..enum import BlendingMode, CacheType, Direction
 from ..imgproc import alpha_composite
 from ..transform import Transform, TransformValue
-from .protocol import AUDIO_BLOCK_SIZE, AUDIO_SAMPLING_RATE, AudioLayer, Layer
+from .protocol import AUDIO_BLOCK_SIZE, AUDIO_SAMPLING_RATE, AudioLayer, BasicLayer, Layer
 
 
 class Composition:
@@ -53,21 +66,110 @@ class Composition:
             A tuple representing the size of the composition in the form of ``(width, height)``.
         duration:
             The duration along the time axis for the composition.
+        dirty_rect:
+            If ``True``, each frame is rendered from the previously rendered frame and only the region
+            covered by the layers whose keys have changed is composited again.
+            This speeds up rendering when small layers move over a large static background.
+            Note that rendered frames are shared with the composition and must not be modified in place.
+        n_threads:
+            The number of threads used to composite a single frame. If greater than 1, the canvas is split
+            into horizontal strips and the layers are composited for each strip in parallel.
+            This reduces the latency of each frame, e.g., for interactive previews.
+            Rotated or scaled layers may differ from the single-threaded result by one level
+            in a few pixels.
+        concurrent_layers:
+            If ``True`` and ``n_threads`` is greater than 1, the images of the active layers (including their effects)
+            are rendered concurrently with ``n_threads`` threads before they are composited in order.
+            Layers or effects whose ``thread_safe`` property is ``False`` are rendered in the calling thread.
+        cache:
+            The cache of rendered frames and layer images. ``'disk'`` (default) uses ``diskcache.Cache``
+            in a temporary directory, ``'memory'`` uses ``movis.cache.MemoryCache`` that keeps arrays in memory
+            without serializing them, and ``None`` turns caching off.
+            An object that complies with ``movis.cache.CacheBackend`` can also be given.
+            ``movis.cache.PersistentCache`` keeps the cache in a directory across runs.
+            If ``cache`` is a string, a nested composition shares the cache of the composition it is added to,
+            so that a whole tree of compositions is cached within the budget of the outermost one.
+        cache_size:
+            The maximum size of the cache in bytes. It is ignored if ``cache`` is an object.
+        cache_warped:
+            If ``True``, the images of the layers after they are transformed (`i.e.`, rotated, scaled, and moved)
+            are also cached, so that the layers whose images and transforms do not change are only blitted.
+            This speeds up rendering large rotated or scaled layers at the cost of a larger cache.
     """
 
     def __init__(
-        self, size: tuple[int, int] = (1920, 1080), duration: float = 1.0
+        self, size: tuple[int, int] = (1920, 1080), duration: float = 1.0,
+        dirty_rect: bool = False, n_threads: int = 1, concurrent_layers: bool = False,
+        cache: CacheSpec = 'disk', cache_size: int = DEFAULT_CACHE_SIZE, cache_warped: bool = False,
     ) -> None:
-        self._layers: list[LayerItem] = []
+        # Layer items are stored in the rendering order, and the list of them is made on demand
         self._name_to_layer: dict[str, LayerItem] = {}
+        self._layer_list: list[LayerItem] | None = []
+        self._n_batch_updates = 0
+        self._cache_outdated = False
         assert duration > 0, "duration must be positive"
         self._duration = duration
-        self._cache: Cache = Cache(size_limit=1024 * 1024 * 1024)
+        self._cache_spec = cache
+        self._cache_size = cache_size
+        self._cache = CacheView(cache, cache_size)
+        self._plate: _Plate | None = None
+        self._prev_layer_keys: tuple[Hashable, ...] = ()
+        self._active_index: _ActiveLayerIndex | None = None
+        # Incremented whenever the timing of a layer item in this composition changes
+        self._timing_generation = 0
+        self._key_memo: tuple[int, float, tuple[Hashable, ...], tuple[Hashable, ...]] | None = None
+        self._fingerprint_memo: tuple[int, str] | None = None
+        self._dirty_rect = dirty_rect
+        self._prev_render: _RenderState | None = None
+        assert n_threads > 0, "n_threads must be positive"
+        self._n_threads = n_threads
+        self._executor: ThreadPoolExecutor | None = None
+        self._concurrent_layers = concurrent_layers
+        self._cache_warped = cache_warped
+        self._lock = threading.RLock()
+        self._n_allocations = 0
         self._preview_level: int = 1
         assert isinstance(size, tuple) and len(size) == 2, "size must be a tuple of length 2"
         assert size[0] > 0 and size[1] > 0, "size must be positive"
         self._size = size
 
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        state['_cache'] = None
+        state['_plate'] = None
+        state['_prev_layer_keys'] = ()
+        state['_prev_render'] = None
+        state['_executor'] = None
+        state['_lock'] = None
+        state['_active_index'] = None
+        state['_key_memo'] = None
+        state['_fingerprint_memo'] = None
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._cache = CacheView(self._cache_spec, self._cache_size)
+        self._lock = threading.RLock()
+
+    def _reset_cache(self) -> None:
+        # Give this composition (and nested ones) a private cache and thread pool, e.g., in a worker process.
+        self._cache = CacheView(self._cache_spec, self._cache_size)
+        self._executor = None
+        self._lock = threading.RLock()
+        for layer_item in self._layers:
+            if isinstance(layer_item.layer, Composition):
+                layer_item.layer._reset_cache()
+                layer_item.layer._share_cache(self._cache)
+
+    def _share_cache(self, parent: CacheView) -> None:
+        # Only compositions with a default cache follow the cache of the composition they are added to
+        if not isinstance(self._cache_spec, str):
+            return
+        self._cache = parent.share()
+        for layer_item in self._layers:
+            if isinstance(layer_item.layer, Composition):
+                layer_item.layer._share_cache(self._cache)
+
     @property
     def size(self) -> tuple[int, int]:
         """The size of the composition in the form of ``(width, height)``."""
@@ -78,11 +180,22 @@ class Composition:
         """The duration of the composition."""
         return self._duration
 
+    def get_image_size(self, time: float) -> tuple[int, int]:
+        """Returns the size of the image rendered by ``__call__``, `i.e.`, ``size`` divided by ``preview_level``."""
+        return self._size[0] // self._preview_level, self._size[1] // self._preview_level
+
+    @property
+    def thread_safe(self) -> bool:
+        """Whether the composition can be rendered in a worker thread, `i.e.`, all of its layers are thread-safe."""
+        return all(layer_item._thread_safe for layer_item in self._layers)
+
     @property
     def preview_level(self) -> int:
         """The resolution of the rendering of the composition.
         For example, if ``preview_level=2`` is set,
-        the composition's resolution is ``(W / 2, H / 2)``."""
+        the composition's resolution is ``(W / 2, H / 2)``.
+        Layers implementing ``render_scaled`` (`e.g.`, shapes, texts, and nested compositions)
+        are directly rasterized at that resolution."""
         return self._preview_level
 
     @preview_level.setter
@@ -90,7 +203,7 @@ class Composition:
         assert level > 0, "preview_level must be greater than 0"
         self._preview_level = int(level)
         if self._preview_level != level:
-            self._cache.clear()
+            self._clear_cache()
 
     @contextmanager
     def preview(self, level: int = 2) -> Iterator[None]:
@@ -123,6 +236,14 @@ class Composition:
         finally:
             self.preview_level = original_level
 
+    @property
+    def _layers(self) -> list[LayerItem]:
+        layers = self._layer_list
+        if layers is None:
+            layers = list(self._name_to_layer.values())
+            self._layer_list = layers
+        return layers
+
     @property
     def layers(self) -> Sequence[LayerItem]:
         """Returns a list of ``LayerItem`` objects."""
@@ -170,8 +291,15 @@ class Composition:
 
     def __setitem__(self, key: str, value: LayerItem | Layer) -> None:
         if isinstance(value, LayerItem):
-            self._layers.append(value)
+            old_item = self._name_to_layer.get(key)
+            if old_item is not None:
+                old_item._owners.remove(self)
             self._name_to_layer[key] = value
+            value._owners.append(self)
+            self._layer_list = None
+            if isinstance(value.layer, Composition):
+                value.layer._share_cache(self._cache)
+            self._clear_cache()
         elif callable(value):
             self.add_layer(value, name=key)
         else:
@@ -181,17 +309,85 @@ class Composition:
         self.pop_layer(key)
 
     def get_key(self, time: float) -> tuple[Hashable, ...] | None:
-        """Returns a tuple of hashable keys representing the state for each layer at the given time."""
+        """Returns a compact key representing the state of the composition at the given time.
+
+        The key is a pair of ``CacheType.COMPOSITION`` and a fixed-size digest of the keys of the active layers,
+        which are themselves digests of the states of the layers (including nested compositions).
+        """
         if time < 0.0 or self.duration <= time:
             return None
-        layer_keys: list[Hashable] = [CacheType.COMPOSITION]
+        with _memoize_keys():
+            return self._get_key_and_layer_keys(time)[0]
+
+    def _get_fingerprint_state(self) -> tuple[Hashable, ...]:
+        # The content of the composition for stable cache keys. The transforms and the timings of the layers
+        # are not included because they are reflected in the keys of the layers at each time.
+        generation = _get_key_generation()
+        memo = self._fingerprint_memo
+        if generation and memo is not None and memo[0] == generation:
+            return (self._size, memo[1])
+        fingerprint = _digest_key(tuple([(item.name, item._get_fingerprint()) for item in self._layers]))
+        if generation:
+            self._fingerprint_memo = (generation, fingerprint)
+        return (self._size, fingerprint)
+
+    def _clear_fingerprint_memo(self) -> None:
+        # The fingerprints of layers are memoized by identity, so layers changed in place are not noticed
+        self._fingerprint_memo = None
         for layer_item in self._layers:
+            layer_item._fingerprint_memo = None
+            if isinstance(layer_item.layer, Composition):
+                layer_item.layer._clear_fingerprint_memo()
+
+    def _get_key_and_layer_keys(self, time: float) -> tuple[tuple[Hashable, ...], tuple[Hashable, ...]]:
+        # The keys are memoized for the time in the current scope of _memoize_keys(),
+        # since they are required again by nested compositions and layer caches while a frame is rendered.
+        generation = _get_key_generation()
+        memo = self._key_memo
+        if generation and memo is not None and memo[0] == generation and memo[1] == time:
+            return memo[2], memo[3]
+        keys: list[Hashable] = [None] * len(self._layers)
+        for i in self._get_active_indices(time):
+            keys[i] = self._layers[i].get_key(time)
+        layer_keys = tuple(keys)
+        key = _make_composition_key(layer_keys)
+        if generation:
+            self._key_memo = (generation, time, key, layer_keys)
+        return key, layer_keys
+
+    def _get_active_indices(self, time: float) -> list[int]:
+        # Returns the indices of the layers active at the given time in ascending order
+        index = self._active_index
+        if index is None or index.generation != self._timing_generation:
+            index = _ActiveLayerIndex(
+                [(li.offset + li.start_time, li.offset + li.end_time) for li in self._layers],
+                self.duration, self._timing_generation)
+            self._active_index = index
+        indices = []
+        for i in index.query(time):
+            layer_item = self._layers[i]
             layer_time = time - layer_item.offset
-            if layer_time < layer_item.start_time or layer_item.end_time <= layer_time:
-                layer_keys.append(None)
-            else:
-                layer_keys.append(layer_item.get_key(time))
-        return tuple(layer_keys)
+            if layer_item.start_time <= layer_time < layer_item.end_time:
+                indices.append(i)
+        return indices
+
+    def _get_keys(self, times: np.ndarray) -> list[tuple[Hashable, ...]]:
+        # Same as get_key() for each time
+        return [_make_composition_key(layer_keys) for layer_keys in self._get_layer_keys(times)]
+
+    def _get_layer_keys(self, times: np.ndarray) -> list[tuple[Hashable, ...]]:
+        # The keys of each layer are evaluated for all times at once
+        columns: list[list[Hashable]] = []
+        for layer_item in self._layers:
+            layer_times = times - layer_item.offset
+            active = (layer_item.start_time <= layer_times) & (layer_times < layer_item.end_time)
+            indices = np.flatnonzero(active)
+            column: list[Hashable] = [None] * len(times)
+            if len(indices) > 0:
+                for i, key in zip(indices, layer_item._get_keys(times[indices])):
+                    column[i] = key
+            columns.append(column)
+        return list(zip(*columns)) if columns else [()] * len(times)
 
     def __repr__(self) -> str:
         return f"Composition(size={self.size}, duration={self.duration}, layers={self._layers!r})"
@@ -314,11 +510,72 @@ class Composition:
             visible=visible,
             audio=audio,
         )
-        self._layers.append(layer_item)
         self._name_to_layer[name] = layer_item
-        self._cache.clear()
+        layer_item._owners.append(self)
+        if self._layer_list is not None:
+            self._layer_list.append(layer_item)
+        if isinstance(layer, Composition):
+            layer._share_cache(self._cache)
+        self._clear_cache()
         return layer_item
 
+    def add_layers(self, layers: Iterable[Layer | dict[str, Any]]) -> list[LayerItem]:
+        """Add multiple layers to the composition at once.
+
+        This is equivalent to calling ``add_layer()`` for each layer in ``batch_update()``,
+        so the cache of the composition is cleared only once.
+
+        Args:
+            layers:
+                An iterable of layers or dictionaries of the keyword arguments of ``add_layer()``,
+                `e.g.`, ``{'layer': layer, 'offset': 1.0}``.
+
+        Returns:
+            A list of ``LayerItem`` objects in the same order as ``layers``.
+
+        Examples:
+            >>> import movis as mv
+            >>> composition = mv.layer.Composition(size=(640, 480), duration=5.0)
+            >>> image = mv.layer.Image.from_color((100, 100), 'red', duration=1.0)
+            >>> items = composition.add_layers([{'layer': image, 'offset': float(i)} for i in range(5)])
+            >>> len(composition)
+            5
+        """
+        layer_items = []
+        with self.batch_update():
+            for layer in layers:
+                if isinstance(layer, dict):
+                    layer_items.append(self.add_layer(**layer))
+                else:
+                    layer_items.append(self.add_layer(layer))
+        return layer_items
+
+    @contextmanager
+    def batch_update(self) -> Iterator[None]:
+        """Context manager method to add or remove many layers with the cache cleared only once.
+
+        Within the scope, clearing the cache of the composition is deferred until the end of the scope.
+        Rendering the composition in the scope is not recommended because stale layer images may be used.
+
+        Examples:
+            >>> import movis as mv
+            >>> composition = mv.layer.Composition(size=(640, 480), duration=5.0)
+            >>> image = mv.layer.Image.from_color((100, 100), 'red', duration=1.0)
+            >>> with composition.batch_update():
+            ...     for i in range(5):
+            ...         _ = composition.add_layer(image, name=f'image_{i}', offset=float(i))
+            ...     _ = composition.pop_layer('image_0')
+            >>> len(composition)
+            4
+        """
+        self._n_batch_updates += 1
+        try:
+            yield
+        finally:
+            self._n_batch_updates -= 1
+            if self._n_batch_updates == 0 and self._cache_outdated:
+                self._clear_cache()
+
     def pop_layer(self, name: str) -> LayerItem:
         """Removes a layer item from the composition and returns it.
 
@@ -330,45 +587,377 @@ class Composition:
         """
         if name not in self._name_to_layer:
             raise KeyError(f"Layer with name {name} does not exist")
-        index = next(i for i in range(len(self._layers)) if self._layers[i].name == name)
-        layer_item = self._layers.pop(index)
-        self._name_to_layer.pop(name)
-        self._cache.clear()
+        layer_item = self._name_to_layer.pop(name)
+        layer_item._owners.remove(self)
+        self._layer_list = None
+        self._clear_cache()
         return layer_item
 
     def clear(self) -> None:
         """Removes all layers from the composition."""
-        self._layers.clear()
+        for layer_item in self._name_to_layer.values():
+            layer_item._owners.remove(self)
         self._name_to_layer.clear()
-        self._cache.clear()
+        self._layer_list = None
+        self._clear_cache()
+
+    def _clear_cache(self) -> None:
+        if self._n_batch_updates > 0:
+            self._cache_outdated = True
+        else:
+            self._cache.clear()
+            self._cache_outdated = False
+        self._active_index = None
+        self._plate = None
+        self._prev_layer_keys = ()
+        self._prev_render = None
 
     def __call__(
         self, time: float,
         bg_color: tuple[int, int, int, int] = (0, 0, 0, 0),
+        roi: tuple[int, int, int, int] | None = None,
     ) -> np.ndarray | None:
+        """Renders the composition at the given time.
+
+        Args:
+            time:
+                The time at which the composition is rendered.
+            bg_color:
+                The background color of the frame in the form of ``(R, G, B, A)``.
+            roi:
+                An optional region of interest in the form of ``(x, y, width, height)``
+                in the pixel coordinates of the rendered frame (`i.e.`, divided by ``preview_level``).
+                If specified, only the pixels inside the region are warped and composited,
+                and an array of shape ``(height, width, 4)`` is returned. Such partial frames are not cached.
+                Rotated or scaled layers may differ from the full frame by one level in a few pixels.
+
+        Returns:
+            ``None`` if ``time`` is out of range, otherwise a ``numpy.ndarray`` of the rendered frame.
+            The frame may be shared with the cache, in which case it is read-only.
+        """
+        if time < 0.0 or self.duration <= time:
+            return None
+        if roi is not None:
+            return self._render_roi(time, roi, self._preview_level, bg_color)
+        with _memoize_keys():
+            key, layer_keys = self._get_key_and_layer_keys(time)
+            return self._render(time, key, layer_keys, bg_color)
+
+    def render_scaled(self, time: float, scale: float) -> np.ndarray | None:
+        """Renders the composition at a reduced resolution.
+
+        This method is called instead of ``__call__`` when the composition is used as a layer
+        of another composition with ``preview_level > 1``,
+        so that the nested composition is rendered at the preview level of its parent.
+
+        Args:
+            time:
+                The time at which the composition is rendered.
+            scale:
+                The scale of the rendered image relative to ``size``.
+                It must be the reciprocal of a positive integer, `i.e.`, ``1 / preview_level``.
+
+        Returns:
+            ``None`` if ``time`` is out of range, otherwise a ``numpy.ndarray`` of shape
+            ``(H // level, W // level, 4)`` where ``level = 1 / scale``.
+        """
+        level = int(round(1 / scale))
+        assert level > 0 and abs(level * scale - 1) < 1e-6, "scale must be the reciprocal of a positive integer"
         if time < 0.0 or self.duration <= time:
             return None
+        with _memoize_keys():
+            key, layer_keys = self._get_key_and_layer_keys(time)
+            return self._render(time, key, layer_keys, level=level)
 
+    def render_batch(
+        self, times: Sequence[float] | np.ndarray,
+        out: np.ndarray | None = None,
+        bg_color: tuple[int, int, int, int] = (0, 0, 0, 0),
+    ) -> np.ndarray:
+        """Renders the frames at the given times into a single array.
+
+        The states of the layers are evaluated for all times at once,
+        and each distinct frame in the batch is rendered only once.
+
+        Args:
+            times:
+                A one-dimensional sequence of times. Each time must be in ``[0, duration)``.
+            out:
+                An optional ``numpy.ndarray`` of shape ``(N, H, W, 4)`` with ``dtype=numpy.uint8``
+                to which the frames are written, where ``N`` is the number of times.
+                If not specified, a new array is allocated.
+            bg_color:
+                The background color of the frames in the form of ``(R, G, B, A)``.
+
+        Returns:
+            A ``numpy.ndarray`` of shape ``(N, H, W, 4)`` with ``dtype=numpy.uint8``.
+
+        Examples:
+            >>> import movis as mv
+            >>> import numpy as np
+            >>> composition = mv.layer.Composition(size=(640, 480), duration=5.0)
+            >>> frames = composition.render_batch(np.arange(0.0, 1.0, 0.25))
+            >>> frames.shape
+            (4, 480, 640, 4)
+        """
+        times = np.asarray(times, dtype=np.float64)
+        assert times.ndim == 1, "times must be a one-dimensional sequence"
+        if len(times) > 0 and (times.min() < 0.0 or self.duration <= times.max()):
+            raise ValueError(f"times must be in [0, {self.duration})")
         L = self._preview_level
+        shape = (len(times), self.size[1] // L, self.size[0] // L, 4)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        else:
+            assert out.shape == shape, f"out must have shape {shape}, but got {out.shape}"
+            assert out.dtype == np.uint8, "out must have dtype=np.uint8"
+
+        rendered: dict[tuple[Hashable, ...], int] = {}
+        for i, (time, layer_keys) in enumerate(zip(times, self._get_layer_keys(times))):
+            if layer_keys in rendered:
+                out[i] = out[rendered[layer_keys]]
+            else:
+                with _memoize_keys():
+                    self._render(float(time), _make_composition_key(layer_keys), layer_keys, bg_color, out=out[i])
+                rendered[layer_keys] = i
+        return out
+
+    def _render(
+        self, time: float, key: Hashable, layer_keys: tuple[Hashable, ...],
+        bg_color: tuple[int, int, int, int] = (0, 0, 0, 0),
+        out: np.ndarray | None = None,
+        level: int | None = None,
+    ) -> np.ndarray:
+        L = self._preview_level if level is None else level
         current_shape = self.size[1] // L, self.size[0] // L
+        if out is not None:
+            assert out.shape == current_shape + (4,) and out.dtype == np.uint8, \
+                f"out must have shape {current_shape + (4,)} and dtype=np.uint8"
 
-        key = self.get_key(time)
-        if key in self._cache:
-            cached_frame: np.ndarray = self._cache[key]
+        if self._cache.stable_keys:
+            key = (key, get_fingerprint(self))
+        # The item may be evicted by another thread at any time, so it is fetched in a single lookup
+        try:
+            cached_frame: np.ndarray | None = self._cache[key]
+        except KeyError:
+            cached_frame = None
+        if cached_frame is not None:
             if cached_frame.shape[:2] == current_shape:
-                return cached_frame
+                if out is None:
+                    return cached_frame
+                np.copyto(out, cached_frame)
+                return out
             else:
-                del self._cache[key]
+                try:
+                    del self._cache[key]
+                except KeyError:
+                    pass
+
+        bg = tuple(bg_color)
+        with self._lock:
+            frame = None
+            if self._dirty_rect:
+                frame = self._render_dirty_rect(time, layer_keys, bg, L)
+            if frame is None:
+                # The frame kept for dirty-rectangle compositing must not be the caller's buffer
+                frame = self._render_full(time, layer_keys, bg, L, out=None if self._dirty_rect else out)
+            self._prev_layer_keys = layer_keys
+        if frame is not out:
+            self._cache[key] = frame
+        elif not _is_sequential_playback():
+            # The caller's buffer may be overwritten later, so the cache must not share it.
+            # During sequential playback, repeated frames are reused by the caller, so they are not copied.
+            cached_frame = self._allocate(current_shape)
+            np.copyto(cached_frame, frame)
+            self._cache[key] = cached_frame
+        if out is not None:
+            if frame is not out:
+                np.copyto(out, frame)
+            return out
+        # The cache may share the frame with later callers, so it is returned read-only as on a cache hit
+        return _read_only(frame)
+
+    def _render_roi(
+        self, time: float, roi: tuple[int, int, int, int], L: int,
+        bg_color: tuple[int, int, int, int] = (0, 0, 0, 0),
+    ) -> np.ndarray:
+        x, y, w, h = roi
+        assert w > 0 and h > 0, "roi must have a positive size"
+        image = self._allocate((h, w))
+        image[:, :, :] = np.asarray(bg_color, dtype=np.uint8).reshape(1, 1, 4)
+        with _memoize_keys():
+            indices = self._get_active_indices(time)
+            prepared = self._prepare_layers(time, indices, L, canvas_rect=(x, y, x + w, y + h))
+            placements = [placement for placement in prepared if placement is not None]
+            return self._composite_layers(image, placements, parent=(x, y), clip=True)
+
+    def _get_render_size(self, L: int) -> tuple[int, int]:
+        return self._size[0] // L, self._size[1] // L
+
+    def _allocate(self, shape: tuple[int, int]) -> np.ndarray:
+        self._n_allocations += 1
+        return np.empty(shape + (4,), dtype=np.uint8)
+
+    def _render_full(
+        self, time: float, layer_keys: tuple[Hashable, ...], bg: tuple[int, ...], L: int,
+        out: np.ndarray | None = None,
+    ) -> np.ndarray:
+        current_shape = self.size[1] // L, self.size[0] // L
+        frame = self._allocate(current_shape) if out is None else out
+
+        # Start from the cached plate if the keys of the bottom layers have not changed since it was made
+        plate = self._plate
+        if plate is not None and plate.bg_color == bg and plate.image.shape[:2] == current_shape \
+                and layer_keys[:plate.n_layers] == plate.layer_keys:
+            np.copyto(frame, plate.image)
+            start = plate.n_layers
+            bboxes = list(plate.bboxes)
+        else:
+            frame[:, :, :] = np.asarray(bg, dtype=np.uint8).reshape(1, 1, 4)
+            start = 0
+            bboxes = []
+
+        # The bottom layers whose keys are the same as in the previous frame are regarded as static
+        n_static = _get_common_prefix_length(layer_keys, self._prev_layer_keys)
+        indices = [i for i in self._get_active_indices(time) if start <= i]
+        bboxes.extend([None] * (len(self._layers) - start))
+        plate_index = n_static if start < n_static < len(self._layers) else None
+        placements: list[_Placement] = []
+        # The sentinel at the end makes the plate even if no layer above it is active
+        for i, placement in zip(indices + [len(self._layers)], self._prepare_layers(time, indices, L) + [None]):
+            if plate_index is not None and plate_index <= i:
+                frame = self._composite_layers(frame, placements)
+                placements = []
+                plate_image = self._allocate(current_shape)
+                np.copyto(plate_image, frame)
+                self._plate = _Plate(n_static, layer_keys[:n_static], bg, tuple(bboxes[:n_static]), plate_image)
+                plate_index = None
+            if placement is not None:
+                bboxes[i] = placement.bbox
+                placements.append(placement)
+        frame = self._composite_layers(frame, placements)
+        if self._dirty_rect:
+            self._prev_render = _RenderState(layer_keys, tuple(bboxes), bg, frame)
+        return frame
 
-        frame = np.empty(current_shape + (4,), dtype=np.uint8)
-        frame[:, :, :] = np.asarray(bg_color, dtype=np.uint8).reshape(1, 1, 4)
-        for layer_item in self._layers:
-            frame = layer_item._composite(
-                frame, time, preview_level=self._preview_level,
-                cache=self._cache)
-        self._cache[key] = frame
+    def _render_dirty_rect(
+        self, time: float, layer_keys: tuple[Hashable, ...], bg: tuple[int, ...], L: int,
+    ) -> np.ndarray | None:
+        H, W = self.size[1] // L, self.size[0] // L
+        state = self._prev_render
+        if state is None or state.bg_color != bg or state.image.shape[:2] != (H, W) \
+                or len(state.layer_keys) != len(layer_keys):
+            return None
+        # Let a full render make the plate first if static bottom layers are not covered by it yet
+        plate = self._plate
+        if plate is None or plate.bg_color != bg or plate.image.shape[:2] != (H, W) \
+                or layer_keys[:plate.n_layers] != plate.layer_keys:
+            plate = None
+        n_plate = 0 if plate is None else plate.n_layers
+        if n_plate < _get_common_prefix_length(layer_keys, self._prev_layer_keys):
+            return None
+
+        # Collect the regions covered by the changed layers both in the previous and the current frame
+        bboxes = list(state.bboxes)
+        changed = [i for i, (key, prev_key) in enumerate(zip(layer_keys, state.layer_keys)) if key != prev_key]
+        prepared = dict(zip(changed, self._prepare_layers(time, changed, L)))
+        dirty: _Rect | None = None
+        for i in changed:
+            placement = prepared[i]
+            bbox = None if placement is None else placement.bbox
+            dirty = _union_rect(_union_rect(dirty, bboxes[i]), bbox)
+            bboxes[i] = bbox
+        dirty = _intersect_rect(dirty, (0, 0, W, H))
+
+        if dirty is None:
+            frame = state.image
+        else:
+            # Composite the layers overlapping the dirty region again
+            x0, y0, x1, y1 = dirty
+            region = self._allocate((y1 - y0, x1 - x0))
+            if plate is None:
+                region[:, :, :] = np.asarray(bg, dtype=np.uint8).reshape(1, 1, 4)
+            else:
+                np.copyto(region, plate.image[y0:y1, x0:x1])
+            overlapped = [
+                i for i in self._get_active_indices(time)
+                if n_plate <= i and _intersect_rect(bboxes[i], dirty) is not None]
+            missing = [i for i in overlapped if i not in prepared]
+            prepared.update(zip(missing, self._prepare_layers(time, missing, L)))
+            placements = [p for p in (prepared[i] for i in overlapped) if p is not None]
+            frame = self._allocate((H, W))
+            np.copyto(frame, state.image)
+            frame[y0:y1, x0:x1] = self._composite_layers(region, placements, parent=(x0, y0))
+        self._prev_render = _RenderState(layer_keys, tuple(bboxes), bg, frame)
         return frame
 
+    def _prepare_layers(
+        self, time: float, indices: Sequence[int], L: int, canvas_rect: _Rect | None = None,
+    ) -> list[_Placement | None]:
+        layer_items = [self._layers[i] for i in indices]
+        results: list[_Placement | None] = [None] * len(layer_items)
+
+        generation = _get_key_generation()
+        sequential = _is_sequential_playback()
+        if canvas_rect is None:
+            canvas_rect = (0, 0) + self._get_render_size(L)
+
+        def prepare(js: list[int]) -> None:
+            with _memoize_keys(generation or None), _sequential_playback(sequential):
+                for j in js:
+                    results[j] = layer_items[j]._prepare(
+                        time, preview_level=L, cache=self._cache, canvas_rect=canvas_rect,
+                        cache_warped=self._cache_warped)
+
+        if not self._concurrent_layers or self._n_threads <= 1 or len(layer_items) <= 1:
+            prepare(list(range(len(layer_items))))
+            return results
+
+        # Items sharing the same layer object are rendered in the same task,
+        # and the tasks containing a non-thread-safe item run in the calling thread.
+        groups: dict[int, list[int]] = {}
+        for j, layer_item in enumerate(layer_items):
+            groups.setdefault(id(layer_item.layer), []).append(j)
+        serial: list[int] = []
+        tasks: list[list[int]] = []
+        for js in groups.values():
+            if all(layer_items[j]._thread_safe for j in js):
+                tasks.append(js)
+            else:
+                serial.extend(js)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._n_threads)
+        futures = [self._executor.submit(prepare, js) for js in tasks]
+        try:
+            prepare(sorted(serial))
+        finally:
+            wait(futures)
+        for future in futures:
+            future.result()
+        return results
+
+    def _composite_layers(
+        self, image: np.ndarray, placements: Sequence[_Placement], parent: tuple[int, int] = (0, 0),
+        clip: bool = False,
+    ) -> np.ndarray:
+        n_strips = min(self._n_threads, image.shape[0] // _MIN_STRIP_HEIGHT)
+        if n_strips <= 1 or len(placements) == 0:
+            for placement in placements:
+                placement.composite(image, parent=parent, clip=clip, in_place=True)
+            return image
+
+        # Composite the whole layer stack for each horizontal strip in parallel
+        def composite_strip(y0: int, y1: int) -> None:
+            strip = image[y0:y1]
+            for placement in placements:
+                placement.composite(strip, parent=(parent[0], parent[1] + y0), clip=True, in_place=True)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._n_threads)
+        bounds = np.linspace(0, image.shape[0], n_strips + 1).astype(int).tolist()
+        list(self._executor.map(composite_strip, bounds[:-1], bounds[1:]))
+        return image
+
     def get_audio(self, start_time: float, end_time: float) -> np.ndarray | None:
         """Returns the audio of the composition as a numpy array.
 
@@ -402,15 +991,120 @@ class Composition:
             audio[:, ind_start:ind_end] += audio_i[:, :length]
         return audio
 
+    def _iter_frames(
+        self, times: np.ndarray, bg_color: tuple[int, int, int, int] = (0, 0, 0, 0),
+        pool: _FramePool | None = None,
+    ) -> Iterator[np.ndarray]:
+        # Reuse the previous frame as long as the key does not change between consecutive frames,
+        # which skips compositing and cache lookups entirely for static runs.
+        L = self._preview_level
+        shape = self.size[1] // L, self.size[0] // L
+        prev_key: Hashable = None
+        prev_frame: np.ndarray | None = None
+        for t in times:
+            with _memoize_keys(), _sequential_playback():
+                key, layer_keys = self._get_key_and_layer_keys(float(t))
+                if prev_frame is None or key != prev_key:
+                    out = None if pool is None else pool.acquire(shape)
+                    prev_frame = np.asarray(self._render(float(t), key, layer_keys, bg_color, out=out))
+                    prev_key = key
+            yield prev_frame
+
+    def _iter_frames_parallel(
+        self, times: np.ndarray, workers: int,
+        bg_color: tuple[int, int, int, int] = (0, 0, 0, 0),
+    ) -> Iterator[np.ndarray]:
+        chunk_size = int(np.clip(len(times) // (4 * workers), 1, 32))
+        chunks = [times[i: i + chunk_size] for i in range(0, len(times), chunk_size)]
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=_get_mp_context(),
+            initializer=_init_render_worker, initargs=(self,))
+        try:
+            # Keep a bounded number of chunks in flight and yield them in submission order
+            futures: deque[Future[list[np.ndarray]]] = deque()
+            for chunk in chunks:
+                futures.append(executor.submit(_render_frames, chunk, bg_color))
+                if len(futures) >= 2 * workers:
+                    yield from futures.popleft().result()
+            while futures:
+                yield from futures.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def iter_frames(
+        self,
+        start_time: float = 0.0,
+        end_time: float | None = None,
+        fps: float = 30.0,
+        prefetch: int = 0,
+        workers: int = 1,
+        bg_color: tuple[int, int, int, int] = (0, 0, 0, 0),
+    ) -> Iterator[np.ndarray]:
+        """Returns an iterator over the frames of the composition in chronological order.
+
+        This is the primitive used by ``Composition.write_video()`` and ``Composition.render_and_play()``,
+        and it can be used to stream frames into other sinks (`e.g.`, a custom encoder or a network socket).
+
+        .. note::
+            Consecutive frames with the same ``Composition.get_key()`` are yielded as the same array object,
+            so the yielded frames must not be modified in place.
+
+        Args:
+            start_time:
+                The time of the first frame.
+            end_time:
+                The end time of the frames (exclusive).
+                If not specified, the composition's duration is used for ``end_time``.
+            fps:
+                The frame rate. Default is ``30.0``.
+            prefetch:
+                The maximum number of frames rendered ahead of the consumer. If ``prefetch > 0``,
+                frames are rendered by a background thread while the consumer processes the previous ones.
+                If ``prefetch=0``, each frame is rendered when it is requested. Default is ``0``.
+            workers:
+                The number of worker processes used to render frames.
+                See ``Composition.write_video()`` for details. Default is ``1``.
+            bg_color:
+                The background color of the frames in the form of ``(R, G, B, A)``.
+
+        Returns:
+            An iterator that yields ``numpy.ndarray`` of shape ``(H, W, 4)`` with ``dtype=numpy.uint8``.
+
+        Examples:
+            >>> import movis as mv
+            >>> composition = mv.layer.Composition(size=(640, 480), duration=5.0)
+            >>> for frame in composition.iter_frames(fps=30.0, prefetch=8):
+            ...     pass
+        """
+        assert prefetch >= 0, "prefetch must be nonnegative"
+        assert workers > 0, "workers must be positive"
+        assert fps > 0, "fps must be positive"
+        if end_time is None:
+            end_time = self.duration
+        times = np.arange(start_time, end_time, 1.0 / fps)
+        return self._stream_frames(times, prefetch=prefetch, workers=workers, bg_color=bg_color)
+
+    def _stream_frames(
+        self, times: np.ndarray, prefetch: int = 0, workers: int = 1,
+        bg_color: tuple[int, int, int, int] = (0, 0, 0, 0),
+        pool: _FramePool | None = None,
+    ) -> Iterator[np.ndarray]:
+        if workers > 1:
+            frames: Iterator[np.ndarray] = self._iter_frames_parallel(times, workers, bg_color)
+        else:
+            frames = self._iter_frames(times, bg_color, pool=pool)
+        if prefetch > 0:
+            frames = _prefetch(frames, prefetch)
+        return frames
+
     def _write_video(
-        self, start_time: float, end_time: float,
-        fps: float, writer: Format.Writer,
+        self, times: np.ndarray, writer: Format.Writer | _FFmpegPipeWriter,
+        workers: int = 1, queue_size: int = 0, pbar: tqdm | None = None,
     ) -> None:
-        times = np.arange(start_time, end_time, 1.0 / fps)
-        for t in tqdm(times, total=len(times)):
-            frame = np.asarray(self(t, bg_color=(0, 0, 0, 255)))
-            writer.append_data(frame)
-        writer.close()
+        # The frames are not referenced after they are encoded, so their buffers are recycled
+        frames = self._stream_frames(
+            times, workers=workers, bg_color=(0, 0, 0, 255), pool=_FramePool(queue_size + 3))
+        _write_frames(writer, frames, total=len(times), queue_size=queue_size, pbar=pbar)
 
     def write_video(
         self,
@@ -424,6 +1118,13 @@ class Composition:
         fps: float = 30.0,
         audio: bool = True,
         audio_codec: str | None = None,
+        workers: int = 1,
+        queue_size: int = 0,
+        segments: int = 1,
+        backend: str = "imageio",
+        incremental: bool = False,
+        gop_size: int = 150,
+        vfr: bool = False,
     ) -> None:
         """Writes the composition's contents to a video file.
 
@@ -455,47 +1156,169 @@ class Composition:
                 The codec used to encode the audio. If not specified, the default codec
                 determined by ``codec`` is used. For example, if ``codec="libx264"``,
                 the default value of ``audio_codec`` is ``aac``.
+            workers:
+                The number of worker processes used to render frames. If ``workers > 1``,
+                the timeline is split into chunks and each worker renders them with its own copy
+                of the composition (and its own cache). The rendered frames are reordered before encoding,
+                so the output is identical to that of ``workers=1``. Worker processes are spawned,
+                so the composition must be picklable (`e.g.`, no lambdas), and a script must call
+                this method under ``if __name__ == "__main__":``. Default is ``1``.
+            queue_size:
+                The maximum number of rendered frames waiting to be encoded. If ``queue_size > 0``,
+                frames are encoded by a dedicated thread so that rendering and encoding overlap,
+                and the time each stage spent waiting for the other is shown in the progress bar.
+                If ``queue_size=0``, frames are rendered and encoded one after another. Default is ``0``.
+            segments:
+                The number of segments the video is split into. If ``segments > 1``, each segment is
+                rendered and encoded with the same codec settings by its own worker process. The segments
+                are then joined by the ffmpeg concat demuxer without re-encoding, and the audio is muxed once
+                at the end. As with ``workers``, the worker processes are spawned, so the composition must be
+                picklable. It cannot be combined with ``workers``. Default is ``1``.
+            backend:
+                The backend used to encode frames. ``"imageio"`` uses the writer of imageio,
+                while ``"ffmpeg"`` spawns ffmpeg and writes raw frames directly into its stdin without
+                extra copies. Both backends accept the same codec and parameter arguments.
+                Default is ``"imageio"``.
+            incremental:
+                If ``True``, the video is encoded as independent segments of ``gop_size`` frames,
+                which are kept in the ``{dst_file}.segments`` directory together with the digests of
+                ``Composition.get_key()`` for every frame. On the next call, only the segments whose
+                digests have changed are re-rendered and re-encoded, and all segments are joined into
+                ``dst_file`` without re-encoding. Changes that are not reflected in ``get_key()``
+                (`e.g.`, the color of a ``Rectangle`` or an overwritten image file) are detected by
+                ``movis.cache.get_fingerprint()`` of the composition, and all segments are re-encoded for them.
+                It cannot be combined with ``segments``. Default is ``False``.
+            gop_size:
+                The number of frames in each segment when ``incremental=True``. Default is ``150``.
+            vfr:
+                If ``True``, the video is written with a variable frame rate, where a run of identical
+                consecutive frames is stored as a single long frame. The last frame is held until ``end_time``,
+                so the duration of the video is the same as with a constant frame rate.
+                Note that it uses the ``-vf`` option of ffmpeg and disables B-frames, so it cannot be combined
+                with other video filters in ``output_params``. Default is ``False``.
+
+        .. note::
+            Consecutive frames with the same ``Composition.get_key()`` are not composited again;
+            the previous frame buffer is passed to the encoder as it is.
         """
+        assert workers > 0, "workers must be positive"
+        assert queue_size >= 0, "queue_size must be nonnegative"
+        assert segments > 0, "segments must be positive"
+        assert gop_size > 0, "gop_size must be positive"
+        if workers > 1 and segments > 1:
+            raise ValueError("workers and segments cannot be combined")
+        if incremental and segments > 1:
+            raise ValueError("incremental and segments cannot be combined")
         if end_time is None:
             end_time = self.duration
-        writer = None
-        if audio:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                audio_file = Path(temp_dir) / "audio.wav"
+        writer_kwargs: dict[str, Any] = dict(
+            codec=codec, pixelformat=pixelformat,
+            input_params=input_params, output_params=output_params, backend=backend, vfr=vfr)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path = None
+            if audio:
                 audio_array = self.get_audio(start_time, end_time)
-                if audio_array is None:
-                    audio_path = None
-                else:
+                if audio_array is not None:
+                    audio_file = Path(temp_dir) / "audio.wav"
                     sf.write(
                         str(audio_file), audio_array.transpose(),
                         samplerate=AUDIO_SAMPLING_RATE,
                         subtype='PCM_16')
                     audio_path = str(audio_file)
-                with warnings.catch_warnings():
-                    # XXX: Suppress the deprecation warning from imageio-ffmpeg.
-                    warnings.simplefilter("ignore", category=DeprecationWarning)
-                    writer = imageio.get_writer(
-                        uri=str(dst_file), fps=fps, codec=codec, pixelformat=pixelformat,
-                        macro_block_size=None, ffmpeg_log_level="error",
-                        input_params=input_params, output_params=output_params,
-                        audio_path=audio_path, audio_codec=audio_codec)
-                    self._write_video(start_time, end_time, fps, writer)
-        else:
-            with warnings.catch_warnings():
-                # XXX: Suppress the deprecation warning from imageio-ffmpeg.
-                warnings.simplefilter("ignore", category=DeprecationWarning)
-                writer = imageio.get_writer(
-                    uri=str(dst_file), fps=fps, codec=codec, pixelformat=pixelformat,
-                    input_params=input_params, output_params=output_params,
-                    macro_block_size=None, ffmpeg_log_level="error")
-                self._write_video(start_time, end_time, fps, writer)
+            if incremental:
+                self._write_video_incremental(
+                    start_time, end_time, fps, dst_file, gop_size, writer_kwargs,
+                    workers=workers, queue_size=queue_size,
+                    audio_path=audio_path, audio_codec=audio_codec)
+            elif segments > 1:
+                self._write_video_segments(
+                    start_time, end_time, fps, dst_file, Path(temp_dir), segments,
+                    writer_kwargs, audio_path=audio_path, audio_codec=audio_codec)
+            else:
+                times = np.arange(start_time, end_time, 1.0 / fps)
+                writer = _get_video_writer(
+                    dst_file, fps, n_frames=len(times), audio_path=audio_path, audio_codec=audio_codec,
+                    **writer_kwargs)
+                self._write_video(times, writer, workers=workers, queue_size=queue_size)
+
+    def _write_video_segments(
+        self, start_time: float, end_time: float, fps: float,
+        dst_file: str | PathLike, temp_dir: Path, segments: int,
+        writer_kwargs: dict[str, Any],
+        audio_path: str | None = None, audio_codec: str | None = None,
+    ) -> None:
+        times = np.arange(start_time, end_time, 1.0 / fps)
+        segment_times = [ts for ts in np.array_split(times, segments) if len(ts) > 0]
+        suffix = Path(dst_file).suffix
+        segment_files = [str(temp_dir / f"segment_{i:05d}{suffix}") for i in range(len(segment_times))]
+        with ProcessPoolExecutor(
+                max_workers=len(segment_times), mp_context=_get_mp_context(),
+                initializer=_init_render_worker, initargs=(self,)) as executor:
+            futures = [
+                executor.submit(_write_segment, ts, fps, segment_file, writer_kwargs)
+                for ts, segment_file in zip(segment_times, segment_files)]
+            with tqdm(total=len(times)) as pbar:
+                for future in as_completed(futures):
+                    pbar.update(future.result())
+        _concat_video_segments(segment_files, dst_file, audio_path=audio_path, audio_codec=audio_codec)
+
+    def _write_video_incremental(
+        self, start_time: float, end_time: float, fps: float,
+        dst_file: str | PathLike, gop_size: int, writer_kwargs: dict[str, Any],
+        workers: int = 1, queue_size: int = 0,
+        audio_path: str | None = None, audio_codec: str | None = None,
+    ) -> None:
+        segment_dir = Path(f"{dst_file}.segments")
+        segment_dir.mkdir(parents=True, exist_ok=True)
+        manifest_file = segment_dir / "manifest.json"
+        suffix = Path(dst_file).suffix
+        self._clear_fingerprint_memo()
+        with _memoize_keys():
+            fingerprint = get_fingerprint(self)
+        settings = dict(
+            fps=fps, size=list(self.size), preview_level=self.preview_level,
+            gop_size=gop_size, suffix=suffix, fingerprint=fingerprint, **writer_kwargs)
+
+        times = np.arange(start_time, end_time, 1.0 / fps)
+        digests = [_digest_key(self.get_key(float(t))) for t in times]
+        new_segments = [digests[i: i + gop_size] for i in range(0, len(digests), gop_size)]
+        old_segments: list[list[str] | None] = []
+        if manifest_file.exists():
+            with open(manifest_file, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("settings") == settings:
+                old_segments = manifest["segments"]
+
+        segment_files = [segment_dir / f"segment_{i:05d}{suffix}" for i in range(len(new_segments))]
+        changed = [
+            i for i, (segment, segment_file) in enumerate(zip(new_segments, segment_files))
+            if i >= len(old_segments) or old_segments[i] != segment or not segment_file.exists()]
+
+        # Mark the segments to be re-encoded as invalid first so that an interrupted run is never reused
+        changed_set = set(changed)
+        segments: list[list[str] | None] = [
+            None if i in changed_set else old_segments[i] for i in range(len(new_segments))]
+        _write_manifest(manifest_file, settings, segments)
+        with tqdm(total=sum(len(new_segments[i]) for i in changed)) as pbar:
+            for i in changed:
+                segment_times = times[i * gop_size: (i + 1) * gop_size]
+                writer = _get_video_writer(segment_files[i], fps, n_frames=len(segment_times), **writer_kwargs)
+                self._write_video(segment_times, writer, workers=workers, queue_size=queue_size, pbar=pbar)
+                segments[i] = new_segments[i]
+        _write_manifest(manifest_file, settings, segments)
+        for stale_file in segment_dir.glob(f"segment_*{suffix}"):
+            if stale_file not in segment_files:
+                stale_file.unlink()
+        _concat_video_segments(
+            [str(f) for f in segment_files], dst_file, audio_path=audio_path, audio_codec=audio_codec)
 
     def render_and_play(
         self,
         start_time: float = 0.0,
         end_time: float | None = None,
         fps: float = 30.0,
-        preview_level: int = 2
+        preview_level: int = 2,
+        queue_size: int = 0,
     ) -> None:
         """Renders the composition and plays it in a Jupyter notebook.
 
@@ -514,6 +1337,9 @@ class Composition:
                 The resolution of the rendering of the composition.
                 For example, if ``preview_level=2`` is set, the resolution of the output is ``(W / 2, H / 2)``.
                 Default is ``2``.
+            queue_size:
+                The maximum number of rendered frames waiting to be encoded.
+                See ``Composition.write_video()`` for details. Default is ``0``.
         """
         from IPython.display import display
         from ipywidgets import Video
@@ -531,10 +1357,9 @@ class Composition:
                     ffmpeg_params=["-preset", "veryfast"],
                     pixelformat="yuv444p", macro_block_size=None,
                     ffmpeg_log_level="error")
-                for t in tqdm(times, total=len(times)):
-                    frame = np.asarray(self(t, bg_color=(0, 0, 0, 255)))
-                    writer.append_data(frame)
-                writer.close()
+                frames = self._stream_frames(
+                    times, bg_color=(0, 0, 0, 255), pool=_FramePool(queue_size + 3))
+                _write_frames(writer, frames, total=len(times), queue_size=queue_size)
                 display(Video.from_file(filename, autoplay=True, loop=True))
 
     def write_audio(
@@ -575,6 +1400,222 @@ class Composition:
             subtype=subtype)
 
 
+_Rect = tuple[int, int, int, int]
+_MIN_STRIP_HEIGHT = 16
+_IDENTITY_AFFINE = np.array([[1, 0, 0], [0, 1, 0]], dtype=np.float64)
+_MAX_RECENT_KEYS = 64
+_ADMISSION_WARMUP = 4
+_STATS_DECAY = 0.1
+_MAX_INDEX_BUCKETS = 4096
+_MAX_INDEX_SPAN = 64
+_INDEX_MARGIN = 1e-6
+
+
+class _Plate(NamedTuple):
+    """A composited image of the bottom ``n_layers`` layers, which is reused while their keys are unchanged."""
+    n_layers: int
+    layer_keys: tuple[Hashable, ...]
+    bg_color: tuple[int, ...]
+    bboxes: tuple[_Rect | None, ...]
+    image: np.ndarray
+
+
+class _RenderState(NamedTuple):
+    """The layer keys and bounding boxes of the last rendered frame, used for dirty-rectangle compositing."""
+    layer_keys: tuple[Hashable, ...]
+    bboxes: tuple[_Rect | None, ...]
+    bg_color: tuple[int, ...]
+    image: np.ndarray
+
+
+class _WarpedImage(NamedTuple):
+    """A layer image transformed into the bounding box ``bbox`` on the canvas."""
+    image: np.ndarray
+    bbox: _Rect
+
+
+class _Placement(NamedTuple):
+    """A layer image and the affine matrix that places it in the bounding box ``bbox`` on the canvas.
+
+    If ``affine_matrix`` is ``None``, the image has already been transformed into the bounding box.
+    """
+    image: np.ndarray
+    affine_matrix: np.ndarray | None
+    bbox: _Rect
+    opacity: float
+    blending_mode: BlendingMode
+
+    def warp(self) -> _Placement:
+        """Returns the placement of the image transformed into the bounding box."""
+        if self.affine_matrix is None:
+            return self
+        x0, y0, x1, y1 = self.bbox
+        image = cv2.warpAffine(
+            self.image, self.affine_matrix, dsize=(x1 - x0, y1 - y0),
+            flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+        return self._replace(image=image, affine_matrix=None)
+
+    def composite(
+        self, bg_image: np.ndarray, parent: tuple[int, int] = (0, 0),
+        clip: bool = False, in_place: bool = False,
+    ) -> np.ndarray:
+        x0, y0, x1, y1 = self.bbox
+        affine_matrix = self.affine_matrix
+        if affine_matrix is None:
+            # Blit the transformed image
+            fg_image = self.image
+            if clip:
+                h, w = bg_image.shape[:2]
+                rect = _intersect_rect(self.bbox, (parent[0], parent[1], parent[0] + w, parent[1] + h))
+                if rect is None:
+                    return bg_image
+                fg_image = fg_image[rect[1] - y0: rect[3] - y0, rect[0] - x0: rect[2] - x0]
+                x0, y0 = rect[0], rect[1]
+            return alpha_composite(
+                bg_image, fg_image, position=(x0 - parent[0], y0 - parent[1]),
+                opacity=self.opacity, blending_mode=self.blending_mode, in_place=in_place)
+        if clip:
+            # Warp only the part overlapping bg_image. The result may differ from
+            # the unclipped one by one level due to the fixed-point arithmetic of OpenCV.
+            h, w = bg_image.shape[:2]
+            rect = _intersect_rect(self.bbox, (parent[0], parent[1], parent[0] + w, parent[1] + h))
+            if rect is None:
+                return bg_image
+            affine_matrix = affine_matrix.copy()
+            affine_matrix[:, 2] -= (rect[0] - x0, rect[1] - y0)
+            x0, y0, x1, y1 = rect
+        fg_image = cv2.warpAffine(
+            self.image, affine_matrix, dsize=(x1 - x0, y1 - y0),
+            flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+        return alpha_composite(
+            bg_image, fg_image, position=(x0 - parent[0], y0 - parent[1]),
+            opacity=self.opacity, blending_mode=self.blending_mode, in_place=in_place)
+
+
+def _union_rect(a: _Rect | None, b: _Rect | None) -> _Rect | None:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _intersect_rect(a: _Rect | None, b: _Rect | None) -> _Rect | None:
+    if a is None or b is None:
+        return None
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[2], b[2]), min(a[3], b[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1, y1)
+
+
+class _CacheStats:
+    """The render cost and the reuse of the images of a layer item, which decide whether its images are cached.
+
+    An image is cached only if rendering it again is estimated to cost more than retrieving it from the cache,
+    and it is likely to be requested again, i.e., its key has been missed recently or the images of the layer
+    have been hit often enough. During sequential playback, images are not admitted while the stats warm up,
+    so that images that never repeat (e.g., frames of videos) do not evict useful entries.
+    """
+
+    def __init__(self) -> None:
+        self.n_hits = 0
+        self.n_misses = 0
+        self.render_cost = 0.0
+        self.hit_cost_per_byte = 0.0
+        self._recent_keys: OrderedDict[Hashable, None] = OrderedDict()
+
+    def record_hit(self, seconds: float, nbytes: int) -> None:
+        self.n_hits += 1
+        cost = seconds / max(nbytes, 1)
+        self.hit_cost_per_byte = cost if self.n_hits == 1 \
+            else (1 - _STATS_DECAY) * self.hit_cost_per_byte + _STATS_DECAY * cost
+
+    def admit(self, key: Hashable, seconds: float, nbytes: int, sequential: bool = False) -> bool:
+        self.n_misses += 1
+        self.render_cost = seconds if self.n_misses == 1 \
+            else (1 - _STATS_DECAY) * self.render_cost + _STATS_DECAY * seconds
+        recent = key in self._recent_keys
+        self._recent_keys[key] = None
+        self._recent_keys.move_to_end(key)
+        if _MAX_RECENT_KEYS < len(self._recent_keys):
+            self._recent_keys.popitem(last=False)
+
+        if seconds <= self.hit_cost_per_byte * nbytes:
+            return False
+        elif recent or self.n_misses <= 4 * self.n_hits:
+            return True
+        return not sequential and self.n_misses <= _ADMISSION_WARMUP
+
+
+class _FramePool:
+    """A ring of frame buffers, where each buffer is reused after ``size`` other buffers have been acquired.
+
+    The consumer of the frames must not hold more than ``size - 1`` of them at the same time.
+    """
+
+    def __init__(self, size: int) -> None:
+        assert size > 0, "size must be positive"
+        self._size = size
+        self._buffers: deque[np.ndarray] = deque()
+        self.n_allocations = 0
+
+    def acquire(self, shape: tuple[int, int]) -> np.ndarray:
+        if len(self._buffers) >= self._size:
+            buffer = self._buffers.popleft()
+            if buffer.shape[:2] == shape:
+                self._buffers.append(buffer)
+                return buffer
+        buffer = np.empty(shape + (4,), dtype=np.uint8)
+        self.n_allocations += 1
+        self._buffers.append(buffer)
+        return buffer
+
+
+class _ActiveLayerIndex:
+    """An index of the time intervals of layers, which finds the candidates of the layers active at a given time.
+
+    The duration of the composition is divided into buckets, and each layer is registered in the buckets
+    its interval overlaps. Layers spanning many buckets (`e.g.`, backgrounds) are kept in a separate list
+    that is checked for every query.
+    """
+    def __init__(self, intervals: Sequence[tuple[float, float]], duration: float, generation: int):
+        self.generation = generation
+        n_layers = len(intervals)
+        self._begins = np.array([begin for begin, _ in intervals], dtype=np.float64).reshape(n_layers)
+        self._ends = np.array([end for _, end in intervals], dtype=np.float64).reshape(n_layers)
+        self._n_buckets = int(np.clip(n_layers, 1, _MAX_INDEX_BUCKETS))
+        self._bucket_width = duration / self._n_buckets
+        buckets: list[list[int]] = [[] for _ in range(self._n_buckets)]
+        long_layers: list[int] = []
+        for i, (begin, end) in enumerate(intervals):
+            # The margins keep the layers at the boundaries of buckets, and the exact check is done by the caller
+            k0 = max(int(np.floor((begin - _INDEX_MARGIN) / self._bucket_width)), 0)
+            k1 = min(int(np.floor((end + _INDEX_MARGIN) / self._bucket_width)) + 1, self._n_buckets)
+            if _MAX_INDEX_SPAN < k1 - k0:
+                long_layers.append(i)
+            else:
+                for k in range(k0, k1):
+                    buckets[k].append(i)
+        self._buckets = [np.array(bucket, dtype=np.int64) for bucket in buckets]
+        self._long_layers = np.array(long_layers, dtype=np.int64)
+
+    def query(self, time: float) -> list[int]:
+        k = min(max(int(time / self._bucket_width), 0), self._n_buckets - 1)
+        candidates = np.concatenate([self._buckets[k], self._long_layers])
+        mask = (self._begins[candidates] - _INDEX_MARGIN <= time) & (time < self._ends[candidates] + _INDEX_MARGIN)
+        return np.sort(candidates[mask]).tolist()
+
+
+def _get_common_prefix_length(x: Sequence[Hashable], y: Sequence[Hashable]) -> int:
+    n = min(len(x), len(y))
+    for i in range(n):
+        if x[i] != y[i]:
+            return i
+    return n
+
+
 class LayerItem:
     """A wrapper layer for managing additional info. (e.g., the name and position) of each layer in a composition.
 
@@ -622,13 +1663,60 @@ class LayerItem:
         self.layer: Layer = layer
         self.name: str = name
         self.transform: Transform = transform if transform is not None else Transform()
-        self.offset: float = offset
-        self.start_time: float = start_time
-        self.end_time: float = end_time if end_time is not None else getattr(layer, "duration", 1e6)
+        self._offset: float = offset
+        self._start_time: float = start_time
+        self._end_time: float = end_time if end_time is not None else getattr(layer, "duration", 1e6)
         self.audio_level: Attribute = Attribute(audio_level, AttributeType.SCALAR, range=(-1000, 1000))
         self.visible: bool = visible
         self.audio: bool = audio
         self._effects: list[Effect] = []
+        self._key_memo: tuple[int, float, str] | None = None
+        self._fingerprint_memo: tuple[Any, tuple[Effect, ...], str] | None = None
+        self._cache_stats = _CacheStats()
+        self._warped_cache_stats = _CacheStats()
+        # The compositions that contain this item, which are notified when its timing changes
+        self._owners: list[Composition] = []
+
+    def __getstate__(self) -> dict[str, Any]:
+        state = self.__dict__.copy()
+        state['_key_memo'] = None
+        state['_fingerprint_memo'] = None
+        return state
+
+    def _notify_timing_change(self) -> None:
+        # Let the compositions containing this item rebuild their index of active layers
+        for composition in self._owners:
+            composition._timing_generation += 1
+
+    @property
+    def offset(self) -> float:
+        """The starting time of the layer in the composition."""
+        return self._offset
+
+    @offset.setter
+    def offset(self, value: float) -> None:
+        self._offset = value
+        self._notify_timing_change()
+
+    @property
+    def start_time(self) -> float:
+        """The start time of the layer, used to clip the layer in the time axis direction."""
+        return self._start_time
+
+    @start_time.setter
+    def start_time(self, value: float) -> None:
+        self._start_time = value
+        self._notify_timing_change()
+
+    @property
+    def end_time(self) -> float:
+        """The end time of the layer, used to clip the layer in the time axis direction."""
+        return self._end_time
+
+    @end_time.setter
+    def end_time(self, value: float) -> None:
+        self._end_time = value
+        self._notify_timing_change()
 
     @property
     def duration(self) -> float:
@@ -702,7 +1790,7 @@ class LayerItem:
         """The blending mode of the layer."""
         return self.transform.blending_mode
 
-    def get_key(self, time: float) -> tuple[Hashable, Hashable, Hashable]:
+    def get_key(self, time: float) -> str:
         """Returns the state of the layer item at the given time.
 
         Args:
@@ -710,10 +1798,21 @@ class LayerItem:
                 The time at which the layer is rendered.
 
         Returns:
-            A tuple of hashable keys representing the state of the layer at the given time."""
+            A fixed-size digest of the transform, the layer key, and the effect keys at the given time."""
+        generation = _get_key_generation()
+        memo = self._key_memo
+        if generation and memo is not None and memo[0] == generation and memo[1] == time:
+            return memo[2]
+        key = _digest_key(self._get_key_body(time))
+        if generation:
+            self._key_memo = (generation, time, key)
+        return key
+
+    def _get_key_body(self, time: float) -> tuple[Hashable, Hashable, Hashable]:
         if not self.visible:
             return (None, None, None)
-        layer_time = time - self.offset
+        # Numpy scalars are converted so that equal keys are digested into the same value
+        layer_time = float(time - self.offset)
         transform_key = self.transform.get_current_value(layer_time)
         layer_key = self.layer.get_key(layer_time) if hasattr(self.layer, 'get_key') else layer_time
 
@@ -721,56 +1820,226 @@ class LayerItem:
             return e.get_key(layer_time) if hasattr(e, 'get_key') else layer_time
 
         effects_key = None if len(self._effects) == 0 else tuple([get_effect_key(e) for e in self._effects])
-        return (transform_key, layer_key, effects_key)
+        return (_get_transform_key(transform_key), layer_key, effects_key)
 
-    def _get_fg_image(self, time: float, cache: Cache | None = None) -> np.ndarray | None:
+    def _get_keys(self, times: np.ndarray) -> list[str]:
+        # Same as get_key() for each time, but the transform is evaluated for all times at once
+        if not self.visible:
+            return [_digest_key((None, None, None))] * len(times)
+        layer_times = times - self.offset
+        transform_keys = self.transform.get_values(layer_times)
+        keys: list[str] = []
+        for layer_time, transform_key in zip(layer_times.tolist(), transform_keys):
+            layer_key = self.layer.get_key(layer_time) if hasattr(self.layer, 'get_key') else layer_time
+            effects_key = None if len(self._effects) == 0 else tuple([
+                e.get_key(layer_time) if hasattr(e, 'get_key') else layer_time for e in self._effects])
+            keys.append(_digest_key((_get_transform_key(transform_key), layer_key, effects_key)))
+        return keys
+
+    def _get_fingerprint(self) -> str:
+        # A hash of the layer and its effects that is stable across runs. Nested compositions are hashed
+        # every time because their layers can be changed, which is memoized in the scope of _memoize_keys().
+        effects = tuple(self._effects)
+        memo = self._fingerprint_memo
+        if memo is not None and memo[0] is self.layer and len(memo[1]) == len(effects) \
+                and all(e is f for e, f in zip(memo[1], effects)):
+            return memo[2]
+        fingerprint = get_fingerprint((self.layer, effects))
+        if not isinstance(self.layer, Composition):
+            self._fingerprint_memo = (self.layer, effects, fingerprint)
+        return fingerprint
+
+    def _get_cache_key(
+        self, time: float, cache: CacheBackend, scale: float = 1.0, roi: _Rect | None = None,
+    ) -> tuple[Hashable, ...]:
+        key_body = self.get_key(time)
+        # The layer is identified by its content instead of its name if the cache is kept across runs
+        name = self._get_fingerprint() if getattr(cache, 'stable_keys', False) else self.name
+        if roi is not None:
+            return (CacheType.LAYER, name, key_body, scale, roi)
+        elif scale != 1.0:
+            return (CacheType.LAYER, name, key_body, scale)
+        return (CacheType.LAYER, name, key_body)
+
+    def _get_fg_image(
+        self, time: float, cache: CacheBackend | None = None, scale: float = 1.0, roi: _Rect | None = None,
+    ) -> np.ndarray | None:
         key = None
+        stats = self._cache_stats
         if cache is not None:
-            key_body = self.get_key(time)
-            key = (CacheType.LAYER, self.name, key_body)
-            if key in cache:
-                return cache[key]
-        fg_image = self(time)
+            key = self._get_cache_key(time, cache, scale, roi)
+            start = time_module.perf_counter()
+            try:
+                cached_image: np.ndarray = cache[key]
+            except KeyError:
+                pass
+            else:
+                stats.record_hit(time_module.perf_counter() - start, cached_image.nbytes)
+                return cached_image
+        start = time_module.perf_counter()
+        fg_image: np.ndarray | None
+        if roi is not None:
+            fg_image = self._render_roi(time, scale, roi)
+        else:
+            fg_image = self(time) if scale == 1.0 else self._render_scaled(time, scale)
         if fg_image is None:
             return None
         assert isinstance(fg_image, np.ndarray), "Rendered layer image must be a numpy array"
         assert fg_image.dtype == np.uint8, "Rendered layer image must have dtype=np.uint8"
         assert fg_image.ndim == 3, "Rendered layer image must have 3 dimensions (H, W, C)"
         assert fg_image.shape[2] == 4, "Rendered layer image must have 4 channels (RGBA)"
-        if key is not None:
+        seconds = time_module.perf_counter() - start
+        if key is not None and stats.admit(key, seconds, fg_image.nbytes, _is_sequential_playback()):
             cache[key] = fg_image
+            return _read_only(fg_image)
         return fg_image
 
-    def _composite(
-        self, bg_image: np.ndarray, time: float,
-        parent: tuple[int, int] = (0, 0),
-        preview_level: int = 1,
-        cache: Cache | None = None,
-    ) -> np.ndarray:
-        # Retrieve layer image
+    def _get_image_scale(self, preview_level: int) -> float:
+        # Effects work on full-resolution pixels, so only layers without effects are rasterized at a reduced scale
+        if preview_level == 1 or len(self._effects) > 0 or not hasattr(self.layer, 'render_scaled'):
+            return 1.0
+        return 1.0 / preview_level
+
+    def _render_scaled(self, time: float, scale: float) -> np.ndarray | None:
+        if not self.visible:
+            return None
+        return self.layer.render_scaled(time - self.offset, scale)  # type: ignore
+
+    def _render_roi(self, time: float, scale: float, roi: _Rect) -> np.ndarray:
+        assert isinstance(self.layer, Composition)
+        level = int(round(1 / scale)) if scale != 1.0 else self.layer.preview_level
+        x0, y0, x1, y1 = roi
+        return self.layer._render_roi(time - self.offset, (x0, y0, x1 - x0, y1 - y0), level)
+
+    def _get_roi(
+        self, p: TransformValue, preview_level: int, image_scale: float, canvas_rect: _Rect,
+    ) -> tuple[tuple[int, int], _Rect] | None:
+        # Returns the size of the whole image of a nested composition and the region of it visible on the canvas,
+        # or None if the whole image should be rendered.
+        if not isinstance(self.layer, Composition) or len(self._effects) > 0 or not self.visible:
+            return None
+        level = int(round(1 / image_scale)) if image_scale != 1.0 else self.layer.preview_level
+        w, h = self.layer._get_render_size(level)
+        result = _get_fixed_affine_matrix((w, h), p, preview_level=preview_level, image_scale=image_scale)
+        if result is None:
+            return None
+        affine_matrix, (W, H), (offset_x, offset_y) = result
+        x0, y0, x1, y1 = canvas_rect
+        if x0 <= offset_x and y0 <= offset_y and offset_x + W <= x1 and offset_y + H <= y1:
+            return None
+        try:
+            inv_matrix = np.linalg.inv(np.concatenate([affine_matrix, [[0., 0., 1.]]], axis=0))
+        except np.linalg.LinAlgError:
+            return None
+        corners = np.array([
+            [x0 - offset_x, y0 - offset_y, 1],
+            [x1 - offset_x, y0 - offset_y, 1],
+            [x0 - offset_x, y1 - offset_y, 1],
+            [x1 - offset_x, y1 - offset_y, 1]], dtype=np.float64) @ inv_matrix[:2].transpose()
+        # The margin keeps the neighboring pixels used for interpolation
+        margin = 2
+        roi = (
+            max(int(np.floor(corners[:, 0].min())) - margin, 0),
+            max(int(np.floor(corners[:, 1].min())) - margin, 0),
+            min(int(np.ceil(corners[:, 0].max())) + margin, w),
+            min(int(np.ceil(corners[:, 1].max())) + margin, h))
+        if roi[2] <= roi[0] or roi[3] <= roi[1] or roi == (0, 0, w, h):
+            return None
+        return (w, h), roi
+
+    def _is_off_canvas(
+        self, layer_time: float, p: TransformValue, preview_level: int, canvas_rect: _Rect,
+    ) -> bool:
+        # Effects may change the size of the image, so only the size hint of a bare layer is reliable
+        if len(self._effects) > 0 or not self.visible or not hasattr(self.layer, 'get_image_size'):
+            return False
+        layer: BasicLayer = self.layer  # type: ignore
+        size = layer.get_image_size(layer_time)
+        if size is None:
+            return False
+        result = _get_fixed_affine_matrix(size, p, preview_level=preview_level)
+        if result is None:
+            return True
+        _, (W, H), (x, y) = result
+        # A margin of one pixel absorbs the rounding of images rasterized at a reduced scale
+        return _intersect_rect((x - 1, y - 1, x + W + 1, y + H + 1), canvas_rect) is None
+
+    @property
+    def _thread_safe(self) -> bool:
+        return getattr(self.layer, 'thread_safe', True) \
+            and all(getattr(effect, 'thread_safe', True) for effect in self._effects)
+
+    def _prepare(
+        self, time: float, preview_level: int = 1, cache: CacheBackend | None = None,
+        canvas_rect: _Rect | None = None, cache_warped: bool = False,
+    ) -> _Placement | None:
         layer_time = time - self.offset
         if layer_time < self.start_time or self.end_time <= layer_time:
-            return bg_image
-        fg_image = self._get_fg_image(time, cache)
+            return None
+        # Cull the layer before it is rendered if it is transparent or placed outside the canvas
+        p = self.transform.get_current_value(layer_time)
+        if p.opacity <= 0.0:
+            return None
+        if canvas_rect is not None and self._is_off_canvas(layer_time, p, preview_level, canvas_rect):
+            return None
+
+        # The transformed image is only blitted if it is cached
+        warped_key = None
+        if cache_warped and cache is not None:
+            warped_key = (CacheType.WARPED_LAYER,) + self._get_cache_key(time, cache)[1:] + (preview_level,)
+            start = time_module.perf_counter()
+            try:
+                warped: _WarpedImage = cache[warped_key]
+            except KeyError:
+                pass
+            else:
+                self._warped_cache_stats.record_hit(time_module.perf_counter() - start, warped.image.nbytes)
+                return _Placement(warped.image, None, warped.bbox, p.opacity, p.blending_mode)
+
+        # Retrieve layer image. Only the visible part of a nested composition is rendered
+        # unless the whole image is already cached.
+        image_scale = self._get_image_scale(preview_level)
+        roi = None if canvas_rect is None else self._get_roi(p, preview_level, image_scale, canvas_rect)
+        if roi is not None and cache is not None and self._get_cache_key(time, cache, image_scale) in cache:
+            roi = None
+        fg_image = self._get_fg_image(time, cache, scale=image_scale, roi=None if roi is None else roi[1])
         if fg_image is None:
-            return bg_image
+            return None
 
-        # Get affine matrix and transform layer image
-        p = self.transform.get_current_value(layer_time)
-        result = _get_fixed_affine_matrix(fg_image, p, preview_level=preview_level)
+        # Get affine matrix to transform layer image
+        if roi is None:
+            h, w = fg_image.shape[:2]
+            result = _get_fixed_affine_matrix((w, h), p, preview_level=preview_level, image_scale=image_scale)
+        else:
+            result = _get_fixed_affine_matrix(
+                roi[0], p, preview_level=preview_level, image_scale=image_scale, region=roi[1])
         if result is None:
-            return bg_image
+            return None
         affine_matrix_fixed, (W, H), (offset_x, offset_y) = result
-        fg_image_transformed = cv2.warpAffine(
-            fg_image, affine_matrix_fixed, dsize=(W, H),
-            flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+        bbox = (offset_x, offset_y, offset_x + W, offset_y + H)
+        if fg_image.shape[:2] == (H, W) and np.array_equal(affine_matrix_fixed, _IDENTITY_AFFINE):
+            # Layers that are only moved by whole pixels are blitted without warping
+            return _Placement(fg_image, None, bbox, p.opacity, p.blending_mode)
+        placement = _Placement(fg_image, affine_matrix_fixed, bbox, p.opacity, p.blending_mode)
+        if warped_key is None or roi is not None:
+            return placement
+        start = time_module.perf_counter()
+        placement = placement.warp()
+        seconds = time_module.perf_counter() - start
+        if self._warped_cache_stats.admit(warped_key, seconds, placement.image.nbytes, _is_sequential_playback()):
+            cache[warped_key] = _WarpedImage(placement.image, placement.bbox)  # type: ignore
+        return placement
 
-        # Composite bg_image and fg_image
-        bg_image = alpha_composite(
-            bg_image, fg_image_transformed,
-            position=(offset_x - parent[0], offset_y - parent[1]),
-            opacity=p.opacity, blending_mode=p.blending_mode)
-        return bg_image
+    def _composite(
+        self, bg_image: np.ndarray, time: float,
+        parent: tuple[int, int] = (0, 0),
+        preview_level: int = 1,
+        cache: CacheBackend | None = None,
+    ) -> np.ndarray:
+        placement = self._prepare(time, preview_level=preview_level, cache=cache)
+        if placement is None:
+            return bg_image
+        return placement.composite(bg_image, parent=parent)
 
     def __call__(self, time: float) -> np.ndarray | None:
         layer_time = time - self.offset
@@ -805,15 +2074,383 @@ class LayerItem:
             f"offset={self.offset}, visible={self.visible})"
 
 
+def _prefetch(frames: Iterator[np.ndarray], size: int) -> Iterator[np.ndarray]:
+    # Pull frames from ``frames`` in a background thread and keep at most ``size`` of them ahead of the consumer.
+    frame_queue: queue.Queue[tuple[np.ndarray | None, BaseException | None]] = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item: tuple[np.ndarray | None, BaseException | None]) -> bool:
+        while not stop.is_set():
+            try:
+                frame_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for frame in frames:
+                if not put((frame, None)):
+                    return
+            put((None, None))
+        except BaseException as e:
+            put((None, e))
+        finally:
+            # Release the resources of the source (e.g., worker processes) in this thread
+            close = getattr(frames, 'close', None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            frame, error = frame_queue.get()
+            if error is not None:
+                raise error
+            if frame is None:
+                return
+            yield frame
+    finally:
+        stop.set()
+        producer.join()
+
+
+def _write_frames(
+    writer: Format.Writer | _FFmpegPipeWriter, frames: Iterator[np.ndarray],
+    total: int, queue_size: int = 0, pbar: tqdm | None = None,
+) -> None:
+    own_pbar = pbar is None
+    if pbar is None:
+        pbar = tqdm(total=total)
+    try:
+        if queue_size == 0:
+            for frame in frames:
+                writer.append_data(frame)
+                pbar.update(1)
+            return
+
+        # Render in the current thread and encode in another thread through a bounded queue.
+        frame_queue: queue.Queue[np.ndarray | None] = queue.Queue(maxsize=queue_size)
+        errors: list[BaseException] = []
+        encode_stall = 0.0
+
+        def encode() -> None:
+            nonlocal encode_stall
+            while True:
+                t0 = time_module.perf_counter()
+                frame = frame_queue.get()
+                encode_stall += time_module.perf_counter() - t0
+                if frame is None:
+                    return
+                if errors:
+                    continue  # Keep draining the queue so that the render stage never blocks
+                try:
+                    writer.append_data(frame)
+                except BaseException as e:
+                    errors.append(e)
+
+        encoder = threading.Thread(target=encode, daemon=True)
+        encoder.start()
+        render_stall = 0.0
+        try:
+            for frame in frames:
+                if errors:
+                    break
+                t0 = time_module.perf_counter()
+                frame_queue.put(frame)
+                render_stall += time_module.perf_counter() - t0
+                pbar.update(1)
+                pbar.set_postfix(
+                    render_stall=f"{render_stall:.2f}s", encode_stall=f"{encode_stall:.2f}s", refresh=False)
+        finally:
+            frame_queue.put(None)
+            encoder.join()
+        if errors:
+            raise errors[0]
+    finally:
+        if own_pbar:
+            pbar.close()
+        writer.close()
+
+
+class _FFmpegPipeWriter:
+    """A video writer that pipes raw frames directly into ffmpeg.
+
+    Unlike the writer of imageio, frames are written into the stdin of ffmpeg through the buffer protocol
+    without converting or copying them. The input pixel format is ``rgba`` or ``rgb24``,
+    depending on the number of channels of the first frame.
+    """
+
+    def __init__(
+        self, dst_file: str | PathLike, fps: float,
+        codec: str = "libx264", pixelformat: str = "yuv420p",
+        input_params: list[str] | None = None, output_params: list[str] | None = None,
+        audio_path: str | None = None, audio_codec: str | None = None,
+    ) -> None:
+        self._dst_file = str(dst_file)
+        self._fps = fps
+        self._codec = codec
+        self._pixelformat = pixelformat
+        self._input_params = [] if input_params is None else list(input_params)
+        self._output_params = [] if output_params is None else list(output_params)
+        self._audio_path = audio_path
+        self._audio_codec = audio_codec
+        self._shape: tuple[int, ...] | None = None
+        self._process: subprocess.Popen | None = None
+
+    def _open(self, shape: tuple[int, ...]) -> subprocess.Popen:
+        assert len(shape) == 3 and shape[2] in (3, 4), f"Invalid frame shape: {shape}"
+        h, w, c = shape
+        cmd = [
+            imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo", "-s", f"{w}x{h}",
+            "-pix_fmt", "rgba" if c == 4 else "rgb24", "-r", f"{self._fps:.02f}"]
+        cmd += self._input_params + ["-i", "-"]
+        if self._audio_path is not None:
+            cmd += ["-i", self._audio_path]
+        cmd += ["-vcodec", self._codec, "-pix_fmt", self._pixelformat]
+        cmd += self._output_params
+        if self._audio_path is not None:
+            if self._audio_codec is not None:
+                cmd += ["-acodec", self._audio_codec]
+            cmd += ["-map", "0:v:0", "-map", "1:a:0"]
+        cmd += [self._dst_file]
+        return subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def append_data(self, frame: np.ndarray) -> None:
+        assert frame.dtype == np.uint8, "frame must have dtype=np.uint8"
+        if self._process is None:
+            self._shape = frame.shape
+            self._process = self._open(frame.shape)
+        elif frame.shape != self._shape:
+            raise ValueError(f"All frames must have the same shape: {self._shape} != {frame.shape}")
+        assert self._process.stdin is not None
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self._raise_ffmpeg_error()
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        assert process.stdin is not None and process.stderr is not None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {self._dst_file}: {stderr.decode(errors='replace')}")
+
+    def _raise_ffmpeg_error(self) -> None:
+        process, self._process = self._process, None
+        assert process is not None and process.stderr is not None
+        stderr = process.stderr.read()
+        process.wait()
+        raise RuntimeError(f"ffmpeg failed to encode {self._dst_file}: {stderr.decode(errors='replace')}")
+
+
+def _get_video_writer(
+    dst_file: str | PathLike, fps: float,
+    codec: str = "libx264", pixelformat: str = "yuv420p",
+    input_params: list[str] | None = None, output_params: list[str] | None = None,
+    audio_path: str | None = None, audio_codec: str | None = None,
+    backend: str = "imageio", vfr: bool = False, n_frames: int = 0,
+) -> Format.Writer | _FFmpegPipeWriter:
+    if vfr:
+        output_params = list(output_params or []) + _get_vfr_params(n_frames)
+    if backend == "ffmpeg":
+        return _FFmpegPipeWriter(
+            dst_file, fps, codec=codec, pixelformat=pixelformat,
+            input_params=input_params, output_params=output_params,
+            audio_path=audio_path, audio_codec=audio_codec)
+    elif backend != "imageio":
+        raise ValueError(f"Invalid backend: {backend}. 'imageio' or 'ffmpeg' is expected.")
+    with warnings.catch_warnings():
+        # XXX: Suppress the deprecation warning from imageio-ffmpeg.
+        warnings.simplefilter("ignore", category=DeprecationWarning)
+        return imageio.get_writer(
+            uri=str(dst_file), fps=fps, codec=codec, pixelformat=pixelformat,
+            macro_block_size=None, ffmpeg_log_level="error",
+            input_params=input_params, output_params=output_params,
+            audio_path=audio_path, audio_codec=audio_codec)
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def _get_vfr_params(n_frames: int) -> list[str]:
+    # mpdecimate drops the static run at the end of the video, which shortens it. To keep the last frame
+    # (and its duration) without adding another one, the frame is marked in a padding strip
+    # so that mpdecimate never drops it, and the strip is cropped afterwards. Since the duration of
+    # the MP4 container is computed from decoding timestamps, which B-frames shift, B-frames are disabled.
+    last = max(n_frames - 1, 0)
+    filters = (
+        "pad=iw:ih+16:0:0,"
+        f"drawbox=x=0:y=ih-16:w=16:h=16:color=white:t=fill:enable='eq(n\\,{last})',"
+        "mpdecimate=hi=0:lo=0:frac=0,crop=iw:ih-16:0:0")
+    return ["-vf", filters, "-fps_mode", "vfr", "-bf", "0"]
+
+
+def _digest_key(key: Hashable) -> str:
+    return hashlib.blake2b(pickle.dumps(key, protocol=4), digest_size=16).hexdigest()
+
+
+def _get_transform_key(p: TransformValue) -> tuple[Hashable, ...]:
+    # Enum members are replaced by their values since pickling them is much slower than plain values
+    return (p.anchor_point, p.position, p.scale, p.rotation, p.opacity, p.origin_point.value, p.blending_mode.value)
+
+
+def _make_composition_key(layer_keys: tuple[Hashable, ...]) -> tuple[Hashable, ...]:
+    return (CacheType.COMPOSITION, _digest_key(layer_keys))
+
+
+class _KeyMemoState(threading.local):
+    depth: int = 0
+    generation: int = 0
+
+
+_key_memo_state = _KeyMemoState()
+_key_generations = itertools.count(1)
+
+
+@contextmanager
+def _memoize_keys(generation: int | None = None) -> Iterator[int]:
+    # Keys computed in this scope are memoized by time, e.g., while a frame is rendered.
+    # Nested scopes (and worker threads given the generation) share the memoized keys of the outermost one.
+    state = _key_memo_state
+    if state.depth == 0:
+        state.generation = next(_key_generations) if generation is None else generation
+    state.depth += 1
+    try:
+        yield state.generation
+    finally:
+        state.depth -= 1
+
+
+def _get_key_generation() -> int:
+    state = _key_memo_state
+    return state.generation if 0 < state.depth else 0
+
+
+class _PlaybackState(threading.local):
+    sequential: bool = False
+
+
+_playback_state = _PlaybackState()
+
+
+@contextmanager
+def _sequential_playback(sequential: bool = True) -> Iterator[None]:
+    # Frames rendered in this scope are in increasing order of time, which is taken into account by caches
+    state = _playback_state
+    prev = state.sequential
+    state.sequential = sequential
+    try:
+        yield
+    finally:
+        state.sequential = prev
+
+
+def _is_sequential_playback() -> bool:
+    return _playback_state.sequential
+
+
+def _write_manifest(
+    manifest_file: Path, settings: dict[str, Any], segments: list[list[str] | None],
+) -> None:
+    temp_file = manifest_file.with_suffix(".tmp")
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, "segments": segments}, f)
+    temp_file.replace(manifest_file)
+
+
+def _concat_video_segments(
+    segment_files: Sequence[str], dst_file: str | PathLike,
+    audio_path: str | None = None, audio_codec: str | None = None,
+) -> None:
+    list_file = Path(segment_files[0]).parent / "segments.txt"
+    with open(list_file, "w", encoding="utf-8") as f:
+        for segment_file in segment_files:
+            escaped = Path(segment_file).resolve().as_posix().replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", str(list_file)]
+    if audio_path is not None:
+        cmd += ["-i", audio_path]
+    cmd += ["-map", "0:v:0", "-c:v", "copy"]
+    if audio_path is not None:
+        cmd += ["-map", "1:a:0"]
+        if audio_codec is not None:
+            cmd += ["-acodec", audio_codec]
+    cmd += [str(dst_file)]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to concatenate segments: {result.stderr.decode(errors='replace')}")
+
+
+_worker_composition: Composition | None = None
+
+
+def _get_mp_context() -> Any:
+    # NOTE: Forking a process that has already painted with Qt deadlocks the workers,
+    # so "spawn" is used on all platforms and the composition is pickled.
+    return multiprocessing.get_context('spawn')
+
+
+def _init_render_worker(composition: Composition) -> None:
+    global _worker_composition
+    composition._reset_cache()
+    _worker_composition = composition
+
+
+def _render_frames(times: np.ndarray, bg_color: tuple[int, int, int, int]) -> list[np.ndarray]:
+    assert _worker_composition is not None, "render worker is not initialized"
+    return list(_worker_composition._iter_frames(times, bg_color))
+
+
+def _write_segment(
+    times: np.ndarray, fps: float, dst_file: str, writer_kwargs: dict[str, Any],
+) -> int:
+    assert _worker_composition is not None, "render worker is not initialized"
+    writer = _get_video_writer(dst_file, fps, n_frames=len(times), **writer_kwargs)
+    try:
+        for frame in _worker_composition._iter_frames(times, bg_color=(0, 0, 0, 255)):
+            writer.append_data(frame)
+    finally:
+        writer.close()
+    return len(times)
+
+
 def _get_fixed_affine_matrix(
-    fg_image: np.ndarray, p: TransformValue,
-    preview_level: int = 1
+    image_size: tuple[int, int], p: TransformValue,
+    preview_level: int = 1, image_scale: float = 1.0, region: _Rect | None = None,
 ) -> tuple[np.ndarray, tuple[int, int], tuple[int, int]] | None:
-    h, w = fg_image.shape[:2]
+    w, h = image_size
 
+    # A layer image rasterized at ``image_scale`` is placed as if it had its full-resolution size
     T1, SR = _get_T1(p), _get_SR(p)
-    T2 = _get_T2(p, (w, h), p.origin_point)
-    M = T1 @ SR @ T2
+    T2 = _get_T2(p, (w / image_scale, h / image_scale), p.origin_point)
+    S = np.array([
+        [1 / image_scale, 0, 0],
+        [0, 1 / image_scale, 0],
+        [0, 0, 1]], dtype=np.float64)
+    M = T1 @ SR @ T2 @ S
+    if region is not None:
+        # Place only the given region of the image
+        M = M @ np.array([
+            [1, 0, region[0]],
+            [0, 1, region[1]],
+            [0, 0, 1]], dtype=np.float64)
+        w, h = region[2] - region[0], region[3] - region[1]
     P = np.array([
         [1 / preview_level, 0, 0],
         [0, 1 / preview_level, 0],
@@ -859,7 +2496,7 @@ def _get_SR(p: TransformValue) -> np.ndarray:
     return SR
 
 
-def _get_T2(p: TransformValue, size: tuple[int, int], origin_point: Direction) -> np.ndarray:
+def _get_T2(p: TransformValue, size: tuple[float, float], origin_point: Direction) -> np.ndarray:
     center_point = Direction.to_vector(
         origin_point, (float(size[0]), float(size[1])))
     T2 = np.array([
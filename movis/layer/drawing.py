@@ -100,6 +100,8 @@ class Line(AttributesMixin):
         ``start`` ``end`` ``color`` ``width``
             These attributes can be animated as well.
     """
+    thread_safe = False
+
     def __init__(
         self,
         size: tuple[int, int] = (100, 100),
@@ -122,7 +124,15 @@ class Line(AttributesMixin):
     def duration(self) -> float:
         return self._duration
 
+    def get_image_size(self, time: float) -> tuple[int, int]:
+        """Returns the size of the canvas on which the line is drawn."""
+        return self.size
+
     def __call__(self, time: float) -> np.ndarray | None:
+        return self.render_scaled(time, 1.0)
+
+    def render_scaled(self, time: float, scale: float) -> np.ndarray | None:
+        """Draws the line on a canvas of ``scale`` times the size (see ``BasicLayer.render_scaled``)."""
         p0 = self.start(time)
         p1 = self.end(time)
         trim_start = self.trim_start(time)[0]
@@ -132,12 +142,13 @@ class Line(AttributesMixin):
         p_end = p0 + trim_end * (p1 - p0)
         r, g, b = tuple(np.round(self.color(time)).astype(int))
 
-        W, H = self.size
+        W, H = _get_scaled_size(self.size, scale)
         image = QImage(W, H, QImage.Format.Format_ARGB32)
         image.fill(QColor(0, 0, 0, 0))
 
         painter = QPainter(image)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+        painter.scale(scale, scale)
         painter.setPen(QPen(QColor(b, g, r, 255), self.width(time)[0]))
         painter.drawLine(QPointF(*p_start), QPointF(*p_end))
 
@@ -167,6 +178,8 @@ class Rectangle(AttributesMixin):
         ``size``
         ``radius``
     """
+    thread_safe = False
+
     def __init__(
         self,
         size: tuple[float, float] = (100., 100.),
@@ -187,7 +200,19 @@ class Rectangle(AttributesMixin):
     def duration(self) -> float:
         return self._duration
 
+    def get_image_size(self, time: float) -> tuple[int, int] | None:
+        """Returns the size of the image of the rectangle, including the margin for strokes."""
+        if len(self.contents) == 0:
+            return None
+        w, h = [float(x) for x in self.size(time)]
+        W, H = _get_image_size((w, h), _get_max_stroke(self.contents), margin=1.)
+        return int(W), int(H)
+
     def __call__(self, time: float) -> np.ndarray | None:
+        return self.render_scaled(time, 1.0)
+
+    def render_scaled(self, time: float, scale: float) -> np.ndarray | None:
+        """Draws the rectangle at ``scale`` times its resolution (see ``BasicLayer.render_scaled``)."""
         if len(self.contents) == 0:
             return None
         size = [float(x) for x in self.size(time)]
@@ -196,9 +221,8 @@ class Rectangle(AttributesMixin):
 
         eps = 1.
         max_stroke = _get_max_stroke(self.contents)
-        W = np.floor(w + max_stroke + 2 * eps)
-        H = np.floor(h + max_stroke + 2 * eps)
-        image = QImage(W, H, QImage.Format.Format_ARGB32)
+        W, H = _get_image_size((w, h), max_stroke, margin=eps)
+        image = QImage(*_get_scaled_size((W, H), scale), QImage.Format.Format_ARGB32)
         max_color = _get_max_color(self.contents)
         if max_color is None:
             image.fill(QColor(0, 0, 0, 0))
@@ -207,6 +231,7 @@ class Rectangle(AttributesMixin):
 
         painter = QPainter(image)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+        painter.scale(scale, scale)
         rect = QRectF(eps + max_stroke / 2, eps + max_stroke / 2, w, h)
         for c in self.contents:
             if isinstance(c, FillProperty):
@@ -249,6 +274,8 @@ class Ellipse(AttributesMixin):
     Animateable Attributes:
         ``size``
     """
+    thread_safe = False
+
     def __init__(
         self,
         size: tuple[float, float] = (100., 100.),
@@ -267,7 +294,19 @@ class Ellipse(AttributesMixin):
     def duration(self) -> float:
         return self._duration
 
+    def get_image_size(self, time: float) -> tuple[int, int] | None:
+        """Returns the size of the image of the ellipse, including the margin for strokes."""
+        if len(self.contents) == 0:
+            return None
+        w, h = [float(x) for x in self.size(time)]
+        W, H = _get_image_size((w, h), _get_max_stroke(self.contents), margin=1.)
+        return int(W), int(H)
+
     def __call__(self, time: float) -> np.ndarray | None:
+        return self.render_scaled(time, 1.0)
+
+    def render_scaled(self, time: float, scale: float) -> np.ndarray | None:
+        """Draws the ellipse at ``scale`` times its resolution (see ``BasicLayer.render_scaled``)."""
         if len(self.contents) == 0:
             return None
         size = [float(x) for x in self.size(time)]
@@ -275,9 +314,8 @@ class Ellipse(AttributesMixin):
 
         eps = 1.
         max_stroke = _get_max_stroke(self.contents)
-        W = np.floor(w + max_stroke + 2 * eps)
-        H = np.floor(h + max_stroke + 2 * eps)
-        image = QImage(W, H, QImage.Format.Format_ARGB32)
+        W, H = _get_image_size((w, h), max_stroke, margin=eps)
+        image = QImage(*_get_scaled_size((W, H), scale), QImage.Format.Format_ARGB32)
         max_color = _get_max_color(self.contents)
         if max_color is None:
             image.fill(QColor(0, 0, 0, 0))
@@ -286,6 +324,7 @@ class Ellipse(AttributesMixin):
 
         painter = QPainter(image)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+        painter.scale(scale, scale)
         rect = QRectF(eps + max_stroke / 2, eps + max_stroke / 2, w, h)
         for c in self.contents:
             if isinstance(c, FillProperty):
@@ -401,6 +440,8 @@ class Text(AttributesMixin):
         kwargs['duration'] = max(end_times)
         return cls(text=_TextWithTime(start_times, end_times, texts), **kwargs)
 
+    thread_safe = False
+
     def __init__(
         self,
         text: str | Callable[[float], str],
@@ -508,6 +549,10 @@ class Text(AttributesMixin):
         key = super().get_key(time)
         return (self.get_text(time), key)
 
+    def _get_fingerprint_state(self) -> dict[str, Any]:
+        # The text at each time is a part of the key
+        return {name: value for name, value in vars(self).items() if name != '_text'}
+
     def _get_current_cursor_position(
         self, metrics: QFontMetrics, line: str, cursor_y: float,
         lineno: int, width: float
@@ -531,6 +576,10 @@ class Text(AttributesMixin):
         return cursor_x, cursor_y
 
     def __call__(self, time: float) -> np.ndarray | None:
+        return self.render_scaled(time, 1.0)
+
+    def render_scaled(self, time: float, scale: float) -> np.ndarray | None:
+        """Draws the text at ``scale`` times its resolution. The layout is computed at full resolution."""
         if len(self.contents) == 0:
             return None
         text = self.get_text(time)
@@ -548,9 +597,8 @@ class Text(AttributesMixin):
         # more margin in the interim
         margin = 40.
         max_stroke = _get_max_stroke(self.contents)
-        W = np.floor(w + max_stroke + 2 * margin)
-        H = np.floor(h + max_stroke + 2 * margin)
-        image = QImage(W, H, QImage.Format.Format_ARGB32)
+        W, H = _get_image_size((w, h), max_stroke, margin=margin)
+        image = QImage(*_get_scaled_size((W, H), scale), QImage.Format.Format_ARGB32)
         max_color = _get_max_color(self.contents)
         if max_color is None:
             image.fill(QColor(0, 0, 0, 0))
@@ -559,6 +607,7 @@ class Text(AttributesMixin):
 
         painter = QPainter(image)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+        painter.scale(scale, scale)
         qfont = self._get_qfont(time)
         metrics = QFontMetrics(qfont)
         painter.setFont(qfont)
@@ -605,6 +654,14 @@ def _clip_image(image: np.ndarray) -> np.ndarray:
     return clipped_image
 
 
+def _get_image_size(size: tuple[float, float], max_stroke: float, margin: float) -> tuple[float, float]:
+    return float(np.floor(size[0] + max_stroke + 2 * margin)), float(np.floor(size[1] + max_stroke + 2 * margin))
+
+
+def _get_scaled_size(size: tuple[float, float], scale: float) -> tuple[int, int]:
+    return int(np.ceil(size[0] * scale)), int(np.ceil(size[1] * scale))
+
+
 def _get_max_stroke(contents: Sequence[FillProperty | StrokeProperty]) -> float:
     strokes = [c.width for c in contents if isinstance(c, StrokeProperty)]
     return float(max(strokes)) if 0 < len(strokes) else 0.
@@ -52,6 +52,11 @@ class AlphaMatte(AttributesMixin):
         """The duration of the layer."""
         return self.mask.duration
 
+    @property
+    def thread_safe(self) -> bool:
+        """Whether the layer can be rendered in a worker thread."""
+        return getattr(self.mask, 'thread_safe', True) and getattr(self.target, 'thread_safe', True)
+
     def __call__(self, time: float) -> np.ndarray | None:
         if time < 0 or self.duration <= time:
             return None
@@ -97,6 +102,11 @@ class LuminanceMatte:
         """The duration of the layer."""
         return self.mask.duration
 
+    @property
+    def thread_safe(self) -> bool:
+        """Whether the layer can be rendered in a worker thread."""
+        return getattr(self.mask, 'thread_safe', True) and getattr(self.target, 'thread_safe', True)
+
     def __call__(self, time: float) -> np.ndarray | None:
         if time < 0 or self.duration <= time:
             return None
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from os import PathLike
 from pathlib import Path
-from typing import Sequence
+from typing import Any, Sequence
 import warnings
 
 import imageio
@@ -107,6 +107,14 @@ class Image:
         """Get the state index for the given time."""
         return 0 <= time < self.duration
 
+    def get_image_size(self, time: float) -> tuple[int, int]:
+        """Returns the size of the image."""
+        return self.size
+
+    def _get_fingerprint_state(self) -> Path | np.ndarray | None:
+        # The image loaded from a file is identified by the file
+        return self._img_file if self._img_file is not None else self._image
+
     def _read_image(self) -> np.ndarray:
         if self._image is None:
             assert self._img_file is not None
@@ -208,6 +216,12 @@ class ImageSequence(TimelineMixin):
             return -1
         return idx
 
+    def _get_fingerprint_state(self) -> tuple[Any, ...]:
+        sources = [
+            img_file if isinstance(img_file, (str, PathLike)) else image
+            for img_file, image in zip(self.img_files, self.images)]
+        return (self.start_times, self.end_times, sources)
+
     def __call__(self, time: float) -> np.ndarray | None:
         idx = self.get_state(time)
         if idx < 0:
@@ -284,6 +298,10 @@ class Video:
         frame_index = int(time * self._fps)
         return frame_index
 
+    def get_image_size(self, time: float) -> tuple[int, int]:
+        """Returns the size of the video frames without decoding them."""
+        return self._size
+
     def __call__(self, time: float) -> np.ndarray | None:
         if self._reader is None:
             self._reader = imageio.get_reader(self.video_file)
@@ -383,6 +401,9 @@ class Audio:
         """
         return 0
 
+    def _get_fingerprint_state(self) -> Path | np.ndarray | None:
+        return self._audio_file if self._audio_file is not None else self._audio
+
     def get_audio(self, start_time: float, end_time: float) -> np.ndarray | None:
         """Get the audio data for the given time range.
 
@@ -454,6 +475,9 @@ class AudioSequence:
             This method always returns a constant value because the audio data does not affect the image data."""
         return 0
 
+    def _get_fingerprint_state(self) -> tuple[Any, ...]:
+        return (self.start_times, self.end_times, self.audio_files)
+
     def _load_audio(self, index: int) -> np.ndarray:
         a = self._audio[index]
         if a is None:
@@ -29,7 +29,16 @@ class Layer(Protocol):
 
 
 class BasicLayer(Protocol):
-    """The protocol that defines the basic interface for a layer with some optional properties."""
+    """The protocol that defines the basic interface for a layer with some optional properties.
+
+    In addition to the methods below, a layer can optionally implement
+    ``render_scaled(time: float, scale: float) -> numpy.ndarray | None``. It returns the same image as ``__call__``,
+    but rasterized at ``scale`` times its resolution. It is called instead of ``__call__`` when the layer is rendered
+    in a composition with ``preview_level > 1`` (``scale = 1 / preview_level``), which allows the layer to skip
+    drawing pixels that are discarded anyway. The returned image is placed as if its size were divided by ``scale``.
+    If it is not implemented, the layer is rendered at full resolution and downscaled when it is composited.
+    It is not defined in this protocol so that layers subclassing it are not regarded as implementing it.
+    """
 
     def __call__(self, time: float) -> np.ndarray | None:
         """The minimum required method to implement a layer. All layers must implement it.
@@ -75,6 +84,41 @@ class BasicLayer(Protocol):
         """
         return time
 
+    @property
+    def thread_safe(self) -> bool:
+        """An optional property for any layer implementation.
+
+        This property indicates whether the layer can be rendered in a worker thread
+        concurrently with other layers (see ``concurrent_layers`` of ``Composition``).
+        Layers that hold a resource bound to a specific thread should return ``False``
+        so that they are always rendered in the calling thread. For example, the built-in layers that paint
+        with Qt (`e.g.`, ``Rectangle`` and ``Text``) set ``thread_safe = False`` as a class attribute,
+        because painting with Qt must not run concurrently in worker threads.
+
+        If not implemented, it is assumed that the layer is thread-safe.
+
+        Returns:
+            ``True`` if the layer can be rendered in a worker thread.
+        """
+        return True
+
+    def get_image_size(self, time: float) -> tuple[int, int] | None:
+        """An optional method for any layer implementation.
+
+        This method returns the size ``(width, height)`` of the image that ``__call__`` returns at the given time,
+        without rendering it. Movis uses it to skip rendering layers that are placed entirely outside the canvas.
+        The returned size must be exact; ``None`` can be returned if the size is not known in advance.
+
+        If not implemented, the layer is always rendered while it is active.
+
+        Args:
+            time: A scalar variable representing time.
+
+        Returns:
+            The size of the image in the form of ``(width, height)``, or ``None`` if unknown.
+        """
+        return None
+
 
 class AudioLayer(Protocol):
 
@@ -37,6 +37,8 @@ class Gradient(AttributesMixin):
         ``end_color``
     """
 
+    thread_safe = False
+
     def __init__(
         self,
         size: tuple[int, int] = (100, 100),
@@ -59,12 +61,21 @@ class Gradient(AttributesMixin):
             raise ValueError(f"Invalid gradation_type: {gradient_type}. 'linear' or 'radial' is expected.")
         self.gradient_type = gradient_type
 
+    def get_image_size(self, time: float) -> tuple[int, int]:
+        """Returns the size of the generated image."""
+        return self.size
+
     def __call__(self, time: float) -> np.ndarray | None:
+        return self.render_scaled(time, 1.0)
+
+    def render_scaled(self, time: float, scale: float) -> np.ndarray | None:
+        """Fills an image of ``scale`` times the size with the gradient (see ``BasicLayer.render_scaled``)."""
         if time < 0 or time >= self.duration:
             return None
         width, height = self.size
-        image = QImage(width, height, QImage.Format.Format_ARGB32)
+        image = QImage(int(np.ceil(width * scale)), int(np.ceil(height * scale)), QImage.Format.Format_ARGB32)
         painter = QPainter(image)
+        painter.scale(scale, scale)
         ps = self.start_point(time)
         pe = self.end_point(time)
         cs = np.round(self.start_color(time)).astype(int)
@@ -149,10 +160,18 @@ class Stripe(AttributesMixin):
         self.phase = Attribute(phase, AttributeType.SCALAR)
         self.ratio = Attribute(ratio, AttributeType.SCALAR, range=(0., 1.0))
 
+    def get_image_size(self, time: float) -> tuple[int, int]:
+        """Returns the size of the generated image."""
+        return self.size
+
     def __call__(self, time: float) -> np.ndarray | None:
+        return self.render_scaled(time, 1.0)
+
+    def render_scaled(self, time: float, scale: float) -> np.ndarray | None:
+        """Generates the stripes on a pixel grid of ``scale`` times the size (see ``BasicLayer.render_scaled``)."""
         if time < 0 or time >= self.duration:
             return None
-        width, height = self.size
+        width, height = int(np.ceil(self.size[0] * scale)), int(np.ceil(self.size[1] * scale))
         ratio = float(self.ratio(time))
         c1 = np.concatenate([
             np.round(self.color1(time)).reshape(3, 1, 1),
@@ -166,8 +185,8 @@ class Stripe(AttributesMixin):
         elif ratio >= 1.0:
             c2_img = np.broadcast_to(c2, (4, height, width)).transpose(1, 2, 0)
             return c2_img.astype(np.uint8)
-        center = np.array([height / 2, width / 2])[:, None, None]
-        inds = np.mgrid[:height, :width] - center
+        center = np.array([self.size[1] / 2, self.size[0] / 2])[:, None, None]
+        inds = np.mgrid[:height, :width] / scale - center
         theta = float(self.angle(time)) / 180.0 * np.pi
         phase = float(self.phase(time))
         stripe_width = float(self.total_width(time))
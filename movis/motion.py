@@ -310,7 +310,7 @@ def transform_to_numpy(value: int | float | Sequence[float] | np.ndarray, value_
             return np.array([value, value], dtype=np.float64)
         elif value_type in (AttributeType.VECTOR3D, AttributeType.COLOR):
             return np.array([value, value, value], dtype=np.float64)
-    elif isinstance(value, (Sequence, np.ndarray)):
+    elif isinstance(value, (np.ndarray, Sequence)):
         if len(value) == 2 and value_type == AttributeType.VECTOR2D or \
                 len(value) == 3 and value_type in (AttributeType.VECTOR3D, AttributeType.COLOR) or \
                 len(value) == 1 and value_type in (AttributeType.SCALAR, AttributeType.ANGLE):
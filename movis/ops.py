@@ -181,6 +181,8 @@ def tile(
 def crop(layer: BasicLayer, rect: tuple[int, int, int, int]) -> Composition:
     """Crop a layer from a specified rectangle.
 
+    If ``layer`` is a ``Composition``, only the layers inside the rectangle are rendered.
+
     Args:
         layer:
             Layer to crop.
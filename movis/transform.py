@@ -200,6 +200,36 @@ class Transform:
             blending_mode=self.blending_mode,
         )
 
+    def get_values(self, layer_times: np.ndarray) -> list[TransformValue]:
+        """Retrieves the transformation attributes for each of the given times.
+
+        The attributes are evaluated with ``Attribute.get_values()``, so that static attributes are not
+        evaluated for each time. The result is the same as calling ``get_current_value()`` for each time.
+
+        Args:
+            layer_times:
+                A one-dimensional array of times for which you want to get the values.
+
+        Returns:
+            A list of ``TransformValue`` for each time in ``layer_times``.
+        """
+        anchor_points = self.anchor_point.get_values(layer_times)
+        positions = self.position.get_values(layer_times)
+        scales = self.scale.get_values(layer_times)
+        rotations = self.rotation.get_values(layer_times)
+        opacities = self.opacity.get_values(layer_times)
+        return [
+            TransformValue(
+                anchor_point=transform_to_2dvector(anchor_point),
+                position=transform_to_2dvector(position),
+                scale=transform_to_2dvector(scale),
+                rotation=transform_to_1dscalar(rotation),
+                opacity=transform_to_1dscalar(opacity),
+                origin_point=self.origin_point,
+                blending_mode=self.blending_mode,
+            ) for anchor_point, position, scale, rotation, opacity
+            in zip(anchor_points, positions, scales, rotations, opacities)]
+
     def __repr__(self) -> str:
         return f"Transform(ap={self.anchor_point}, pos={self.position}, " \
             f"s={self.scale}, rot={self.rotation}, op={self.opacity}, blend={self.blending_mode})"
@@ -1,6 +1,8 @@
 import os
 import tempfile
+import threading
 
+import imageio
 import numpy as np
 
 import pytest
@@ -8,6 +10,27 @@ import movis as mv
 from movis.layer import Composition
 
 
+class CountingLayer:
+    """A layer of an 8x8 white square that counts how many times its images and keys are requested."""
+
+    def __init__(self, get_key=None, duration=1.0):
+        self.n_calls = 0
+        self.n_key_calls = 0
+        self.duration = duration
+        self._get_key = get_key
+
+    def get_key(self, time):
+        self.n_key_calls += 1
+        return time if self._get_key is None else self._get_key(time)
+
+    def get_image_size(self, time):
+        return (8, 8)
+
+    def __call__(self, time):
+        self.n_calls += 1
+        return np.full((8, 8, 4), 255, dtype=np.uint8)
+
+
 def test_create_composition():
     scene = Composition(size=(640, 480), duration=1.0)
     img = scene(0.0)
@@ -252,3 +275,579 @@ def test_composition_write_video():
         scene.write_video(file_name, fps=3.0)
     finally:
         os.remove(file_name)
+
+
+def test_composition_write_video_with_workers():
+    scene = Composition(size=(64, 48), duration=1.0)
+    item = scene.add_layer(
+        mv.layer.Rectangle((16, 16), color='#ffffff', duration=1.0),
+        name='layer')
+    item.position.enable_motion().extend([0.0, 1.0], [(0.0, 0.0), (64.0, 48.0)])
+
+    times = np.arange(0.0, 1.0, 1.0 / 10.0)
+    frames = list(scene._iter_frames_parallel(times, workers=2))
+    assert len(frames) == len(times)
+    for t, frame in zip(times, frames):
+        assert np.array_equal(frame, scene(t))
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    file_name = temp_file.name
+    temp_file.close()
+    try:
+        scene.write_video(file_name, fps=10.0, workers=2)
+    finally:
+        os.remove(file_name)
+
+
+def test_composition_iter_frames_with_workers_after_render():
+    # Painting with Qt in the parent process must not deadlock the workers
+    scene = Composition(size=(320, 240), duration=1.0)
+    scene.add_layer(mv.layer.Rectangle((120, 80), color='#ff0000', radius=8.0))
+    expected = scene(0.3)
+    frames = list(scene.iter_frames(fps=10.0, workers=3))
+    assert len(frames) == 10
+    assert np.array_equal(frames[3], expected)
+
+
+def test_composition_write_video_with_queue():
+    scene = Composition(size=(64, 48), duration=1.0)
+    scene.add_layer(
+        mv.layer.Rectangle((16, 16), color='#ffffff', duration=1.0),
+        name='layer')
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    file_name = temp_file.name
+    temp_file.close()
+    try:
+        scene.write_video(file_name, fps=10.0, queue_size=2)
+    finally:
+        os.remove(file_name)
+
+
+def test_write_frames_propagates_encoder_error():
+    from movis.layer.composition import _write_frames
+
+    class FailingWriter:
+        def __init__(self):
+            self.closed = False
+
+        def append_data(self, frame):
+            raise RuntimeError("encoder failed")
+
+        def close(self):
+            self.closed = True
+
+    writer = FailingWriter()
+    frames = (np.zeros((4, 4, 4), dtype=np.uint8) for _ in range(10))
+    with pytest.raises(RuntimeError):
+        _write_frames(writer, frames, total=10, queue_size=1)
+    assert writer.closed
+
+
+def test_composition_write_video_with_segments():
+    scene = Composition(size=(64, 48), duration=1.0)
+    scene.add_layer(
+        mv.layer.Rectangle((16, 16), color='#ffffff', duration=1.0),
+        name='layer')
+    scene.add_layer(mv.layer.Audio(np.zeros(mv.AUDIO_SAMPLING_RATE, dtype=np.float32)), name='audio')
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    file_name = temp_file.name
+    temp_file.close()
+    try:
+        scene.write_video(file_name, fps=10.0, segments=3)
+        reader = imageio.get_reader(file_name)
+        assert reader.count_frames() == 10
+        assert 'audio_codec' in reader.get_meta_data()
+        reader.close()
+    finally:
+        os.remove(file_name)
+
+
+def test_composition_write_video_with_segments_after_render():
+    # Painting with Qt in the parent process must not deadlock the segment workers
+    scene = Composition(size=(320, 240), duration=1.0)
+    scene.add_layer(mv.layer.Rectangle((120, 80), color='#ff0000', radius=8.0))
+    scene(0.3)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_name = os.path.join(temp_dir, 'output.mp4')
+        scene.write_video(file_name, fps=10.0, segments=3)
+        reader = imageio.get_reader(file_name)
+        assert reader.count_frames() == 10
+        reader.close()
+
+
+def test_composition_write_video_with_ffmpeg_backend():
+    scene = Composition(size=(64, 48), duration=1.0)
+    scene.add_layer(
+        mv.layer.Rectangle((16, 16), color='#ffffff', duration=1.0),
+        name='layer')
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    file_name = temp_file.name
+    temp_file.close()
+    try:
+        scene.write_video(file_name, fps=10.0, backend='ffmpeg', output_params=['-crf', '0'])
+        reader = imageio.get_reader(file_name)
+        assert reader.count_frames() == 10
+        reader.close()
+    finally:
+        os.remove(file_name)
+
+    with pytest.raises(ValueError):
+        scene.write_video(file_name, fps=10.0, backend='unknown')
+
+
+def test_composition_write_video_incremental():
+    scene = Composition(size=(64, 48), duration=2.0)
+    scene.add_layer(
+        mv.layer.Rectangle((16, 16), color='#ffffff', duration=2.0),
+        name='layer')
+    text = mv.layer.Text.from_timeline([0.0, 1.5], [1.5, 2.0], ['a', 'b'], font_size=10, color='#ff0000')
+    scene.add_layer(text, name='text')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_name = os.path.join(temp_dir, 'output.mp4')
+        scene.write_video(file_name, fps=10.0, incremental=True, gop_size=5)
+        segment_dir = file_name + '.segments'
+        segment_files = sorted(f for f in os.listdir(segment_dir) if f.startswith('segment_'))
+        assert len(segment_files) == 4
+        mtimes = {f: os.stat(os.path.join(segment_dir, f)).st_mtime_ns for f in segment_files}
+
+        text.text.texts[1] = 'c'
+        scene.write_video(file_name, fps=10.0, incremental=True, gop_size=5)
+        changed = [
+            f for f in segment_files if os.stat(os.path.join(segment_dir, f)).st_mtime_ns != mtimes[f]]
+        assert changed == ['segment_00003.mp4']
+        reader = imageio.get_reader(file_name)
+        assert reader.count_frames() == 20
+        reader.close()
+
+        # Changes that are not reflected in the keys are detected by the fingerprint of the composition
+        mtimes = {f: os.stat(os.path.join(segment_dir, f)).st_mtime_ns for f in segment_files}
+        scene['layer'].layer.contents = (mv.layer.drawing.FillProperty(color=(255, 0, 0)),)
+        scene.write_video(file_name, fps=10.0, incremental=True, gop_size=5)
+        changed = [
+            f for f in segment_files if os.stat(os.path.join(segment_dir, f)).st_mtime_ns != mtimes[f]]
+        assert changed == segment_files
+
+
+def test_composition_iter_frames_skips_duplicates():
+    layer = CountingLayer(get_key=lambda time: time < 0.5)
+    scene = Composition(size=(16, 16), duration=1.0)
+    scene.add_layer(layer)
+    frames = list(scene._iter_frames(np.arange(0.0, 1.0, 0.1)))
+    assert len(frames) == 10
+    assert frames[0] is frames[4]
+    assert frames[5] is frames[9]
+    assert layer.n_calls == 2
+
+
+@pytest.mark.parametrize('end_time, n_frames', [
+    (1.0, 12),  # The static run at the end is stored as a single frame held until the end of the timeline
+    (2.0, 20),  # All frames are kept when the layer moves until the last frame
+])
+def test_composition_write_video_with_vfr(end_time, n_frames):
+    scene = Composition(size=(64, 48), duration=2.0)
+    item = scene.add_layer(
+        mv.layer.Rectangle((16, 16), color='#ffffff', duration=end_time),
+        name='layer', end_time=end_time)
+    item.position.enable_motion().extend([0.0, end_time], [(10.0, 10.0), (50.0, 30.0)])
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    file_name = temp_file.name
+    temp_file.close()
+    try:
+        scene.write_video(file_name, fps=10.0, vfr=True)
+        reader = imageio.get_reader(file_name)
+        assert reader.count_frames() == n_frames
+        assert reader.get_meta_data()['duration'] == pytest.approx(scene.duration, abs=0.01)
+        reader.close()
+    finally:
+        os.remove(file_name)
+
+
+def test_composition_static_plate():
+    bg = mv.layer.Image.from_color((16, 16), 'red', duration=1.0)
+    moving = CountingLayer()
+    scene = Composition(size=(16, 16), duration=1.0)
+    bg_item = scene.add_layer(bg, name='bg')
+    scene.add_layer(moving, name='moving')
+
+    frames = [scene(t) for t in np.arange(0.0, 1.0, 0.1)]
+    assert moving.n_calls == 10
+    assert scene._plate is not None and scene._plate.n_layers == 1
+    expected = np.full((16, 16, 4), (255, 0, 0, 255), dtype=np.uint8)
+    expected[4:12, 4:12] = 255
+    for frame in frames:
+        assert np.array_equal(frame, expected)
+
+    # Changing an attribute of the bottom layer must invalidate the plate
+    bg_item.opacity.init_value = 0.0
+    frame = scene(0.95)
+    assert frame[0, 0, 3] == 0
+    scene.pop_layer('bg')
+    assert scene._plate is None
+
+
+def test_composition_dirty_rect():
+    def make_scene(dirty_rect):
+        scene = Composition(size=(64, 48), duration=1.0, dirty_rect=dirty_rect)
+        scene.add_layer(mv.layer.Image.from_color((64, 48), 'red', duration=1.0), name='bg')
+        item = scene.add_layer(mv.layer.Rectangle((10, 10), color='blue', duration=1.0), name='box')
+        item.position.enable_motion().extend([0.0, 1.0], [(5.0, 5.0), (60.0, 40.0)])
+        item.rotation.enable_motion().extend([0.0, 1.0], [0.0, 90.0])
+        scene.add_layer(
+            mv.layer.Rectangle((20, 20), color='green', duration=1.0), name='static',
+            position=(32, 24), opacity=0.5)
+        return scene
+
+    expected = make_scene(False)
+    scene = make_scene(True)
+    for t in np.arange(0.0, 1.0, 0.05):
+        assert np.array_equal(scene(t), expected(t))
+    assert scene._prev_render is not None
+
+
+def test_composition_n_threads():
+    def make_scene(n_threads):
+        scene = Composition(size=(64, 96), duration=1.0, n_threads=n_threads)
+        scene.add_layer(mv.layer.Image.from_color((64, 96), 'red', duration=1.0), name='bg')
+        item = scene.add_layer(mv.layer.Rectangle((30, 40), color='blue', duration=1.0), name='box')
+        item.position.enable_motion().extend([0.0, 1.0], [(0.0, 0.0), (64.0, 96.0)])
+        scene.add_layer(
+            mv.layer.Rectangle((20, 60), color='green', duration=1.0), name='overlay',
+            position=(32, 48), opacity=0.5, blending_mode='multiply')
+        return scene
+
+    expected = make_scene(1)
+    scene = make_scene(4)
+    for t in np.arange(0.0, 1.0, 0.1):
+        assert np.array_equal(scene(t), expected(t))
+    assert scene._executor is not None
+
+
+def test_composition_concurrent_layers():
+    class ThreadRecordingLayer:
+        def __init__(self, color, thread_safe):
+            self.color = color
+            self.thread_safe = thread_safe
+            self.duration = 1.0
+            self.threads = set()
+
+        def __call__(self, time):
+            self.threads.add(threading.get_ident())
+            return np.full((8, 8, 4), self.color, dtype=np.uint8)
+
+    layers = [ThreadRecordingLayer((10 * i, 0, 0, 255), thread_safe=(i % 2 == 0)) for i in range(6)]
+
+    def make_scene(concurrent_layers):
+        scene = Composition(size=(16, 16), duration=1.0, n_threads=3, concurrent_layers=concurrent_layers)
+        for i, layer in enumerate(layers):
+            scene.add_layer(layer, position=(4 + i, 4 + i), opacity=0.7)
+        return scene
+
+    expected = make_scene(False)(0.5)
+    for layer in layers:
+        layer.threads.clear()
+    frame = make_scene(True)(0.5)
+    assert np.array_equal(frame, expected)
+    main_thread = threading.get_ident()
+    assert all(layer.threads == {main_thread} for layer in layers if not layer.thread_safe)
+    assert any(main_thread not in layer.threads for layer in layers if layer.thread_safe)
+
+
+def test_composition_render_batch():
+    scene = Composition(size=(32, 24), duration=1.0)
+    scene.add_layer(mv.layer.Image.from_color((32, 24), 'red', duration=1.0))
+    item = scene.add_layer(mv.layer.Rectangle((8, 8), color='blue', duration=1.0), offset=0.2, end_time=0.5)
+    item.position.enable_motion().extend([0.0, 0.5], [(0.0, 0.0), (32.0, 24.0)])
+    times = np.array([0.0, 0.1, 0.3, 0.6, 0.9, 0.3])
+    for t in times:
+        assert scene._get_keys(np.array([t]))[0] == scene.get_key(t)
+
+    out = np.zeros((len(times), 24, 32, 4), dtype=np.uint8)
+    frames = scene.render_batch(times, out=out)
+    assert frames is out
+    for t, frame in zip(times, frames):
+        assert np.array_equal(frame, scene(t))
+    with pytest.raises(ValueError):
+        scene.render_batch([0.5, 1.0])
+
+
+def test_composition_iter_frames():
+    scene = Composition(size=(32, 24), duration=1.0)
+    item = scene.add_layer(mv.layer.Rectangle((8, 8), color='blue', duration=1.0))
+    item.position.enable_motion().extend([0.0, 1.0], [(0.0, 0.0), (32.0, 24.0)])
+
+    expected = [scene(t) for t in np.arange(0.0, 1.0, 0.1)]
+    for prefetch in [0, 3]:
+        frames = list(scene.iter_frames(fps=10.0, prefetch=prefetch))
+        assert len(frames) == len(expected)
+        for frame, expected_frame in zip(frames, expected):
+            assert np.array_equal(frame, expected_frame)
+
+    # Stopping early must not leave the background thread running
+    n_threads = threading.active_count()
+    frames = scene.iter_frames(fps=10.0, prefetch=2)
+    next(frames)
+    frames.close()
+    assert threading.active_count() == n_threads
+
+
+def test_composition_reuses_frame_buffers():
+    from movis.layer.composition import _FramePool
+
+    scene = Composition(size=(32, 24), duration=1.0)
+    scene.add_layer(mv.layer.Image.from_color((32, 24), 'red', duration=1.0))
+    item = scene.add_layer(mv.layer.Rectangle((8, 8), color='blue', duration=1.0))
+    item.position.enable_motion().extend([0.0, 1.0], [(0.0, 0.0), (32.0, 24.0)])
+    times = np.arange(0.0, 1.0, 0.05)
+    expected = [scene(t).copy() for t in times]
+
+    scene = Composition(size=(32, 24), duration=1.0)
+    scene.add_layer(mv.layer.Image.from_color((32, 24), 'red', duration=1.0))
+    item = scene.add_layer(mv.layer.Rectangle((8, 8), color='blue', duration=1.0))
+    item.position.enable_motion().extend([0.0, 1.0], [(0.0, 0.0), (32.0, 24.0)])
+    pool = _FramePool(3)
+    for frame, expected_frame in zip(scene._iter_frames(times, pool=pool), expected):
+        assert np.array_equal(frame, expected_frame)
+    assert pool.n_allocations == 3
+    # Only the plate of the static background is allocated by the composition,
+    # and frames rendered into the buffers of the pool are not copied into the cache
+    assert scene._n_allocations == 1
+    assert not any(key[0] == mv.enum.CacheType.COMPOSITION for key in scene._cache)
+
+    out = np.empty((len(times), 24, 32, 4), dtype=np.uint8)
+    scene._clear_cache()
+    scene.render_batch(times, out=out)
+    assert np.array_equal(out, np.stack(expected))
+    # Outside sequential playback, the frames are copied into the cache in addition to the plate
+    assert scene._n_allocations == 2 + len(times)
+
+
+def test_composition_render_scaled():
+    def make_scene():
+        scene = Composition(size=(64, 48), duration=1.0)
+        scene.add_layer(mv.layer.Rectangle((32, 16), color='red', duration=1.0), position=(20, 20))
+        nested = Composition(size=(32, 32), duration=1.0)
+        nested.add_layer(mv.layer.Ellipse((16, 16), color='blue', duration=1.0))
+        scene.add_layer(nested, position=(44, 28))
+        return scene, nested
+
+    scene, _ = make_scene()
+    expected = scene(0.0).astype(np.int32)
+    expected = expected.reshape(24, 2, 32, 2, 4).mean(axis=(1, 3))
+
+    scene, nested = make_scene()
+    scene.preview_level = 2
+    img = scene(0.0)
+    assert img.shape == (24, 32, 4)
+    assert np.abs(img - expected).mean() < 4.0
+    # The nested composition is rendered at the preview level of its parent
+    assert nested.preview_level == 1
+    assert nested.render_scaled(0.0, 0.5).shape == (16, 16, 4)
+    keys = [key for key in scene._cache if key[0] == mv.enum.CacheType.LAYER]
+    assert all(key[-1] == 0.5 for key in keys) and len(keys) == 2
+
+
+def test_composition_preview_level_with_basic_layer_subclass():
+    class SquareLayer(mv.layer.protocol.BasicLayer):
+        @property
+        def duration(self):
+            return 1.0
+
+        def __call__(self, time):
+            return np.full((16, 16, 4), 255, dtype=np.uint8)
+
+    scene = Composition(size=(32, 32), duration=1.0)
+    scene.add_layer(SquareLayer())
+    scene.preview_level = 2
+    # Layers without their own render_scaled are rendered at full resolution and downscaled
+    img = scene(0.0)
+    assert img.shape == (16, 16, 4)
+    assert img[8, 8, 3] == 255
+
+
+def test_composition_active_layers():
+    scene = Composition(size=(32, 24), duration=10.0)
+    image = mv.layer.Image.from_color((8, 8), 'red', duration=1.0)
+    items = [scene.add_layer(image, offset=0.5 * i) for i in range(20)]
+    assert scene._get_active_indices(0.0) == [0]
+    assert scene._get_active_indices(1.0) == [1, 2]
+    assert scene._get_active_indices(9.9) == [18, 19]
+    _, layer_keys = scene._get_key_and_layer_keys(1.0)
+    assert layer_keys[0] is None and layer_keys[1] is not None and layer_keys[2] is not None and layer_keys[3] is None
+
+    # Changing the timing of a layer item is reflected immediately
+    items[0].offset = 0.8
+    assert scene._get_active_indices(1.0) == [0, 1, 2]
+    items[19].end_time = 0.1
+    assert scene._get_active_indices(9.9) == [18]
+    assert scene._get_key_and_layer_keys(9.9)[1][19] is None
+
+
+def test_composition_active_layers_are_indexed_per_composition():
+    image = mv.layer.Image.from_color((8, 8), 'red', duration=1.0)
+    scene1 = Composition(size=(32, 24), duration=2.0)
+    scene2 = Composition(size=(32, 24), duration=2.0)
+    item1 = scene1.add_layer(image)
+    scene2.add_layer(image)
+    assert scene1._get_active_indices(1.5) == []
+    assert scene2._get_active_indices(0.5) == [0]
+    index2 = scene2._active_index
+
+    # Editing a layer item in one composition does not invalidate the index of another
+    item1.offset = 1.0
+    assert scene1._get_active_indices(1.5) == [0]
+    assert scene2._get_active_indices(0.5) == [0]
+    assert scene2._active_index is index2
+
+    # A removed layer item no longer affects its former composition
+    scene1.pop_layer(item1.name)
+    scene1._get_active_indices(0.5)
+    index1 = scene1._active_index
+    item1.offset = 0.0
+    scene1._get_active_indices(0.5)
+    assert scene1._active_index is index1
+
+
+def test_composition_add_layers():
+    scene = Composition(size=(32, 24), duration=1.0)
+    image = mv.layer.Image.from_color((8, 8), 'red', duration=1.0)
+    items = scene.add_layers([image, {'layer': image, 'name': 'b', 'position': (4, 4)}, image])
+    assert scene.keys() == ['layer_0', 'b', 'layer_2']
+    assert scene['b'] is items[1]
+    assert tuple(scene['b'].position(0.0)) == (4, 4)
+
+    scene(0.0)
+    with scene.batch_update():
+        scene.pop_layer('layer_0')
+        # Clearing the cache is deferred until the end of the scope
+        assert len(scene._cache) > 0
+        scene.add_layer(image, name='c')
+    assert len(scene._cache) == 0
+    assert scene.keys() == ['b', 'layer_2', 'c']
+    assert [item.name for item in scene.layers] == ['b', 'layer_2', 'c']
+
+
+def test_composition_memoized_keys():
+    layer = CountingLayer()
+    scene = Composition(size=(16, 16), duration=1.0)
+    scene.add_layer(layer)
+    for _ in range(2):
+        parent = Composition(size=(16, 16), duration=1.0)
+        parent.add_layer(scene)
+        scene = parent
+
+    key = scene.get_key(0.5)
+    assert len(key) == 2
+    assert layer.n_key_calls == 1
+    # The keys of all the levels are computed only once for each frame
+    layer.n_key_calls = 0
+    scene(0.25)
+    assert layer.n_key_calls == 1
+    assert scene.get_key(0.25) == scene.get_key(0.25) != key
+
+
+def test_composition_culls_invisible_layers():
+    scene = Composition(size=(32, 24), duration=1.0)
+    layer = CountingLayer()
+    item = scene.add_layer(layer, position=(-10.0, 12.0))
+    item.position.enable_motion().extend([0.0, 1.0], [(-10.0, 12.0), (22.0, 12.0)])
+    transparent = CountingLayer()
+    scene.add_layer(transparent, opacity=0.0)
+
+    assert np.all(scene(0.0) == 0)
+    assert layer.n_calls == 0
+    assert scene(0.5)[12, 6, 3] == 255
+    assert layer.n_calls == 1
+    assert transparent.n_calls == 0
+
+
+def test_composition_roi():
+    inner = Composition(size=(64, 48), duration=1.0)
+    for i in range(4):
+        inner.add_layer(mv.layer.Rectangle(size=(16, 12), color=(60 * i, 128, 255)), position=(12 * i + 8, 10 * i + 6))
+    scene = Composition(size=(64, 48), duration=1.0)
+    scene.add_layer(inner)
+    full = scene(0.0)
+
+    roi = scene(0.0, roi=(10, 8, 30, 20))
+    assert roi.shape == (20, 30, 4)
+    assert np.all(roi == full[8:28, 10:40])
+    cropped = mv.crop(inner, (10, 8, 30, 20))(0.0)
+    assert np.all(cropped == full[8:28, 10:40])
+
+
+def test_composition_cache_admission():
+    class FrameLayer:
+        duration = 1.0
+
+        def get_key(self, time):
+            return time
+
+        def __call__(self, time):
+            return np.full((8, 8, 4), 255, dtype=np.uint8)
+
+    scene = Composition(size=(32, 24), duration=1.0)
+    frames = scene.add_layer(FrameLayer())
+    static = scene.add_layer(mv.layer.Rectangle(size=(16, 12), color=(255, 0, 0)))
+    for _ in scene.iter_frames(fps=10.0):
+        pass
+    # Layer images that never repeat during sequential playback are not cached
+    keys = [key for key in scene._cache if key[0] == mv.enum.CacheType.LAYER]
+    assert len(keys) == 1 and keys[0][1] == static.name
+    assert frames._cache_stats.n_hits == 0 and static._cache_stats.n_hits > 0
+
+
+@pytest.mark.parametrize('make_scene', [
+    lambda inner: mv.repeat(inner, 3),
+    lambda inner: mv.concatenate([inner, inner]),
+])
+def test_composition_cache_reuse_in_sequential_playback(make_scene):
+    # Keyed by frame indices like videos, whose images never repeat within the inner composition
+    layer = CountingLayer(get_key=lambda time: round(time * 10))
+    inner = Composition(size=(16, 16), duration=1.0)
+    inner.add_layer(layer)
+    scene = make_scene(inner)
+    for _ in scene.iter_frames(fps=10.0):
+        pass
+    # The frames of a composition reused later in the timeline are rendered only once
+    assert layer.n_calls == 10
+
+
+def test_composition_cache_warped():
+    def make_scene(cache_warped):
+        scene = Composition(size=(64, 48), duration=1.0, cache='memory', cache_warped=cache_warped)
+        scene.add_layer(mv.layer.Rectangle(size=(24, 16), color=(255, 0, 0)), rotation=30.0, scale=0.8)
+        scene.add_layer(mv.layer.Rectangle(size=(8, 8), color=(0, 255, 0)), position=(10, 10))
+        return scene
+
+    expected = make_scene(False)(0.0)
+    scene = make_scene(True)
+    assert np.all(scene(0.0) == expected)
+    keys = [key for key in scene._cache if key[0] == mv.enum.CacheType.WARPED_LAYER]
+    # Layers moved by whole pixels are blitted without warping, so only the rotated layer is cached
+    assert len(keys) == 1 and keys[0][1] == 'layer_0'
+    # The cached image is blitted when the layers are composited again
+    assert np.all(scene._render_full(0.5, scene._get_key_and_layer_keys(0.5)[1], (0, 0, 0, 0), 1) == expected)
+    assert scene['layer_0']._warped_cache_stats.n_hits == 1
+
+
+def test_composition_cache_eviction_race():
+    class EvictingCache(mv.cache.MemoryCache):
+        # Emulates another thread that evicts every item right after a membership check
+        def __contains__(self, key):
+            return True
+
+        def __getitem__(self, key):
+            raise KeyError(key)
+
+    scene = Composition(size=(32, 24), duration=1.0, cache=EvictingCache(), cache_warped=True)
+    scene.add_layer(mv.layer.Rectangle(size=(16, 12), color=(255, 0, 0)), rotation=30.0)
+    expected = Composition(size=(32, 24), duration=1.0, cache=None)
+    expected.add_layer(mv.layer.Rectangle(size=(16, 12), color=(255, 0, 0)), rotation=30.0)
+    assert np.all(scene(0.0) == expected(0.0))
+    assert np.all(scene(0.0) == expected(0.0))
@@ -0,0 +1,169 @@
+import numpy as np
+from PIL import Image as PILImage
+
+import pytest
+import movis as mv
+from movis.cache import (CompressedCache, MemoryCache, NullCache, PersistentCache, create_cache,
+                         get_fingerprint)
+
+
+def test_memory_cache():
+    cache = MemoryCache(size_limit=300)
+    cache['a'] = np.zeros(100, dtype=np.uint8)
+    cache['b'] = np.zeros(100, dtype=np.uint8)
+    cache['c'] = np.zeros(100, dtype=np.uint8)
+    assert cache.volume() == 300
+    assert not cache['a'].flags.writeable
+    cache['d'] = np.zeros(100, dtype=np.uint8)
+    assert 'a' in cache and 'b' not in cache
+    assert list(cache) == ['c', 'a', 'd']
+    cache['e'] = np.zeros(400, dtype=np.uint8)
+    assert 'e' not in cache
+    del cache['c']
+    assert cache.volume() == 200
+    assert cache.clear() == 2
+    assert len(cache) == 0
+
+
+def test_create_cache():
+    assert isinstance(create_cache('memory', 100), MemoryCache)
+    assert isinstance(create_cache(None), NullCache)
+    cache = MemoryCache()
+    assert create_cache(cache) is cache
+    with pytest.raises(ValueError):
+        create_cache('unknown')
+
+
+@pytest.mark.parametrize('cache', ['disk', 'memory', None])
+def test_composition_cache_backend(cache):
+    scene = mv.layer.Composition(size=(32, 24), duration=1.0, cache=cache, cache_size=1024 * 1024)
+    scene.add_layer(mv.layer.Rectangle(size=(16, 12), color=(255, 0, 0)))
+    frame = scene(0.0)
+    assert frame[12, 16, 0] == 255
+    assert np.all(scene(0.5) == frame)
+
+
+def test_composition_memory_cache_results_are_read_only():
+    scene = mv.layer.Composition(size=(32, 24), duration=1.0, cache='memory')
+    item = scene.add_layer(mv.layer.Rectangle(size=(16, 12), color=(255, 0, 0)))
+    # Results on a miss are shared with the cache as well as those on a hit
+    for render in [lambda: scene(0.0), lambda: item._get_fg_image(0.0, scene._cache)]:
+        first = render()
+        expected = first.copy()
+        with pytest.raises(ValueError):
+            first[:] = 0
+        second = render()
+        assert not second.flags.writeable
+        assert np.array_equal(second, expected)
+
+
+def test_composition_shared_cache():
+    cache = MemoryCache()
+    scene = mv.layer.Composition(size=(32, 24), duration=1.0, cache=cache)
+    nested = mv.layer.Composition(size=(16, 12), duration=1.0)
+    nested.add_layer(mv.layer.Image.from_color((16, 12), 'red', duration=1.0))
+    scene.add_layer(nested)
+    scene.add_layer(mv.layer.Image.from_color((16, 12), 'blue', duration=1.0), position=(0, 0))
+    frame = scene(0.0)
+    assert nested._cache.backend is cache
+    assert len(scene._cache) == 3 and len(nested._cache) == 2
+    # The frame of the nested composition is counted once although the parent also caches it as a layer image
+    assert cache.volume() == frame.nbytes + 3 * 16 * 12 * 4
+
+    # Clearing the cache of a composition does not affect the other compositions in the tree
+    scene._clear_cache()
+    assert len(scene._cache) == 0 and len(nested._cache) == 2
+
+    # A composition whose cache is turned off explicitly keeps it off
+    uncached = mv.layer.Composition(size=(16, 12), duration=1.0, cache=None)
+    uncached.add_layer(mv.layer.Image.from_color((16, 12), 'red', duration=1.0))
+    scene.add_layer(uncached)
+    scene(0.0)
+    assert isinstance(uncached._cache.backend, mv.cache.NullCache) and len(uncached._cache) == 0
+
+
+def test_persistent_cache(tmp_path):
+    n_calls = []
+
+    class ColorLayer:
+        def __init__(self, color):
+            self.color = color
+            self.duration = 1.0
+
+        def get_key(self, time):
+            return 0
+
+        def __call__(self, time):
+            n_calls.append(self.color)
+            return np.full((8, 8, 4), self.color, dtype=np.uint8)
+
+    def render(color):
+        scene = mv.layer.Composition(size=(16, 16), duration=1.0, cache=PersistentCache(tmp_path))
+        scene.add_layer(ColorLayer(64))
+        scene.add_layer(ColorLayer(color), position=(12, 12))
+        return scene(0.0)
+
+    frame = render(128)
+    assert n_calls == [64, 128]
+    assert np.all(render(128) == frame)
+    assert n_calls == [64, 128]
+    # Only the edited layer is rendered again in the next run
+    assert render(255)[12, 12, 0] == 255
+    assert n_calls == [64, 128, 255]
+
+
+def test_fingerprint(tmp_path):
+    image_file = tmp_path / 'image.png'
+    PILImage.new('RGBA', (4, 4), 'red').save(image_file)
+    fingerprint = get_fingerprint(mv.layer.Image(image_file))
+    assert get_fingerprint(mv.layer.Image(str(image_file))) == fingerprint
+    assert get_fingerprint(mv.layer.Image.from_color((4, 4), 'red')) != fingerprint
+    PILImage.new('RGBA', (8, 8), 'red').save(image_file)
+    assert get_fingerprint(mv.layer.Image(image_file)) != fingerprint
+
+
+_FILL_VALUE = 0
+
+
+def test_fingerprint_function():
+    global _FILL_VALUE
+
+    def make_layer(value):
+        def layer(time):
+            return np.full((4, 4, 4), value, dtype=np.uint8)
+        return layer
+
+    # Values captured in closures are hashed
+    assert get_fingerprint(make_layer(0)) == get_fingerprint(make_layer(0))
+    assert get_fingerprint(make_layer(0)) != get_fingerprint(make_layer(255))
+
+    # Global variables referred to by functions are hashed as well
+    def global_layer(time):
+        return np.full((4, 4, 4), _FILL_VALUE, dtype=np.uint8)
+
+    fingerprint = get_fingerprint(global_layer)
+    _FILL_VALUE = 255
+    try:
+        assert get_fingerprint(global_layer) != fingerprint
+    finally:
+        _FILL_VALUE = 0
+    assert get_fingerprint(global_layer) == fingerprint
+
+
+@pytest.mark.parametrize('crop_alpha', [False, True])
+def test_compressed_cache(crop_alpha):
+    cache = CompressedCache('memory', crop_alpha=crop_alpha)
+    image = np.zeros((64, 48, 4), dtype=np.uint8)
+    image[10:20, 5:40] = (255, 0, 0, 255)
+    cache['image'] = image
+    cache['transparent'] = np.zeros((64, 48, 4), dtype=np.uint8)
+    cache['other'] = 'value'
+    assert np.array_equal(cache['image'], image)
+    assert np.array_equal(cache['transparent'], np.zeros((64, 48, 4), dtype=np.uint8))
+    assert cache['other'] == 'value'
+    assert cache.backend.volume() < image.nbytes
+
+    scene = mv.layer.Composition(size=(32, 24), duration=1.0, cache=cache)
+    scene.add_layer(mv.layer.Rectangle(size=(16, 12), color=(255, 0, 0)))
+    frame = scene(0.0)
+    assert np.array_equal(scene(0.5), frame)
@@ -74,3 +74,17 @@ def test_alpha_composite_luminancematte(opacity, blending_mode):
             opacity=opacity, blending_mode=blending_mode, matte_mode=MatteMode.LUMINANCE)
         np.testing.assert_allclose(bg_dst[:, :, 3], 0)
         assert bg_dst.dtype == np.uint8
+
+
+@pytest.mark.parametrize("opacity, blending_mode", alpha_composite_params)
+def test_alpha_composite_in_place(opacity, blending_mode):
+    bg = np.random.randint(0, 255, size=(128, 256, 4)).astype(np.uint8)
+    fg = np.random.randint(0, 255, size=(64, 128, 4)).astype(np.uint8)
+    for (x, y) in [(0, 0), (-10, -20), (96, 48), (-200, -200)]:
+        expected = alpha_composite(
+            bg.copy(), fg, position=(x, y), opacity=opacity, blending_mode=blending_mode)
+        bg_dst = bg.copy()
+        result = alpha_composite(
+            bg_dst, fg, position=(x, y), opacity=opacity, blending_mode=blending_mode, in_place=True)
+        assert result is bg_dst
+        np.testing.assert_array_equal(bg_dst, expected)
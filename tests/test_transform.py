@@ -195,3 +195,11 @@ def test_transform_to_3dvector():
         transform_to_3dvector([3.0, 4.0, 5.0, 6.0])
     with pytest.raises(ValueError):
         transform_to_3dvector([])
+
+
+def test_get_values():
+    transform = Transform(position=(1.0, 2.0), scale=0.5, opacity=0.8)
+    transform.rotation.enable_motion().extend([0.0, 1.0], [0.0, 90.0])
+    times = np.linspace(0.0, 1.0, 5)
+    values = transform.get_values(times)
+    assert values == [transform.get_current_value(t) for t in times]